@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+"""
+Copyright 2019 Harvey Ormston
+
+This file is part of osc_gen.
+
+    osc_gen is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    osc_gen is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with osc_gen.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# Benchmarks for the hot paths of osc_gen.
+#
+# Each benchmark is timed across a range of wave lengths and slot counts, and
+# the best time per call is written to a JSON file. If a baseline file exists,
+# the results are compared against it and any benchmark which has slowed down
+# by more than the threshold is reported as a regression, in which case the
+# exit status is 1.
+#
+# Usage:
+#
+#     python benchmarks/benchmark.py                    # run and compare
+#     python benchmarks/benchmark.py --save-baseline    # store a new baseline
+#     python benchmarks/benchmark.py --quick -k dsp     # smaller run
+
+from __future__ import division
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import timeit
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+# pylint: disable=wrong-import-position
+from osc_gen import dsp
+from osc_gen import sig
+from osc_gen import wavetable
+from osc_gen import wavfile
+from osc_gen import zosc
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(HERE, 'baseline.json')
+DEFAULT_OUTPUT = os.path.join(HERE, 'results.json')
+
+WAVE_LENS = (64, 256, 1024, 4096)
+NUM_SLOTS = (16, 64, 256)
+QUICK_WAVE_LENS = (64, 1024)
+QUICK_NUM_SLOTS = (16, 64)
+
+SAMPLE_RATE = 44100
+
+WAVEFORMS = (
+    ('saw', ()),
+    ('tri', ()),
+    ('sqr', ()),
+    ('pls', (0.25,)),
+    ('sin', ()),
+    ('exp_saw', (2,)),
+    ('exp_sin', (2,)),
+    ('sqr_saw', ()),
+    ('sharkfin', ()),
+    ('noise', (0, 0.25)),
+)
+
+SHAPERS = (
+    ('clip', (1,)),
+    ('tube', (2,)),
+    ('fold', (2,)),
+    ('shape', ()),
+    ('slew', (0.3,)),
+    ('downsample', (4,)),
+    ('quantize', (4,)),
+)
+
+
+def _name(base, **params):
+    """ Build a benchmark name from a base name and parameters """
+
+    return '{0}[{1}]'.format(
+        base, ','.join('{0}={1}'.format(k, params[k]) for k in sorted(params)))
+
+
+def _signal(num_samples, freq=110.0):
+    """ A harmonically rich test signal """
+
+    t = np.arange(num_samples) / SAMPLE_RATE
+    data = np.sin(2 * np.pi * freq * t)
+    data += 0.5 * np.sin(4 * np.pi * freq * t + 0.3)
+    data += 0.25 * np.sign(np.sin(2 * np.pi * freq * t))
+
+    return dsp.normalize(data)
+
+
+def sig_benchmarks(wave_lens, _num_slots, _tmp_dir):
+    """ SigGen waveform generation """
+
+    for wave_len in wave_lens:
+        sig_gen = sig.SigGen(num_points=wave_len)
+        for waveform, args in WAVEFORMS:
+            method = getattr(sig_gen, waveform)
+            yield (_name('sig.' + waveform, len=wave_len),
+                   lambda m=method, a=args: m(*a))
+
+
+def dsp_benchmarks(wave_lens, num_slots, _tmp_dir):
+    """ dsp waveshapers, applied to every slot of a table """
+
+    for wave_len in wave_lens:
+        for slots in num_slots:
+            table = sig.SigGen(num_points=wave_len).sin_batch(
+                harmonic=np.arange(slots) % 8)
+            for shaper, args in SHAPERS:
+                func = getattr(dsp, shaper)
+                yield (_name('dsp.' + shaper, len=wave_len, slots=slots),
+                       lambda f=func, a=args, t=table: f(t.copy(), *a))
+
+
+def analysis_benchmarks(wave_lens, num_slots, _tmp_dir):
+    """ resynthesize, slice_cycles and morph """
+
+    data = _signal(1 << 15)
+    for wave_len in wave_lens:
+        sig_gen = sig.SigGen(num_points=wave_len)
+        yield (_name('dsp.resynthesize', len=wave_len),
+               lambda s=sig_gen: dsp.resynthesize(data, s))
+
+    recording = _signal(10 * SAMPLE_RATE)
+    for slots in num_slots:
+        yield (_name('dsp.slice_cycles', slots=slots, samples=recording.size),
+               lambda n=slots: dsp.slice_cycles(recording, n, SAMPLE_RATE))
+
+    for wave_len in wave_lens:
+        keyframes = sig.SigGen(num_points=wave_len).sin_batch(
+            harmonic=np.arange(8))
+        for slots in num_slots:
+            yield (_name('sig.morph', len=wave_len, slots=slots),
+                   lambda k=keyframes, n=slots: sig.morph(k, n))
+
+
+def io_benchmarks(wave_lens, num_slots, tmp_dir):
+    """ WaveTable.from_wav and the wav and h2p writers """
+
+    filename = os.path.join(tmp_dir, 'source.wav')
+    wavfile.write(_signal(5 * SAMPLE_RATE), filename, SAMPLE_RATE)
+
+    for wave_len in wave_lens:
+        for slots in num_slots:
+            for resynthesize in (False, True):
+                name = _name('WaveTable.from_wav', len=wave_len, slots=slots,
+                             resynthesize=resynthesize)
+                yield (name,
+                       lambda n=slots, w=wave_len, r=resynthesize:
+                       wavetable.WaveTable(n, wave_len=w).from_wav(
+                           filename, resynthesize=r))
+
+    out_wav = os.path.join(tmp_dir, 'out.wav')
+    out_h2p = os.path.join(tmp_dir, 'out.h2p')
+
+    for wave_len in wave_lens:
+        for slots in num_slots:
+            table = wavetable.WaveTable(
+                slots, waves=sig.SigGen(num_points=wave_len).sin_batch(
+                    harmonic=np.arange(slots) % 8))
+            yield (_name('wavfile.write_wavetable', len=wave_len, slots=slots),
+                   lambda t=table: wavfile.write_wavetable(t, out_wav))
+            yield (_name('zosc.write_wavetable', len=wave_len, slots=slots),
+                   lambda t=table: zosc.write_wavetable(t, out_h2p))
+
+
+SUITES = (sig_benchmarks, dsp_benchmarks, analysis_benchmarks, io_benchmarks)
+
+
+def time_call(func, min_time=0.2, repeat=3):
+    """ Get the best time per call of a function in seconds
+
+        @param func callable : Function to time
+        @param min_time float : Minimum duration of each timing run
+        @param repeat int : Number of timing runs
+    """
+
+    timer = timeit.Timer(func)
+
+    number = 1
+    while True:
+        duration = timer.timeit(number)
+        if duration >= min_time or number >= 1 << 20:
+            break
+        number *= max(2, int(min_time / max(duration, 1e-9)))
+
+    runs = [duration] + timer.repeat(repeat=repeat - 1, number=number)
+
+    return min(runs) / number
+
+
+def run(quick=False, keyword=None, min_time=0.2):
+    """ Run all benchmarks
+
+        @param quick bool : Use fewer, smaller sizes
+        @param keyword str : Only run benchmarks with names containing this
+        @param min_time float : Minimum duration of each timing run
+
+        @returns dict : Time per call in seconds, keyed by benchmark name
+    """
+
+    wave_lens = QUICK_WAVE_LENS if quick else WAVE_LENS
+    num_slots = QUICK_NUM_SLOTS if quick else NUM_SLOTS
+    results = {}
+    tmp_dir = tempfile.mkdtemp()
+
+    try:
+        for suite in SUITES:
+            for name, func in suite(wave_lens, num_slots, tmp_dir):
+                if keyword and keyword not in name:
+                    continue
+                results[name] = time_call(func, min_time)
+                print('{0:<70} {1:>12.6f} ms'.format(name, results[name] * 1e3))
+    finally:
+        shutil.rmtree(tmp_dir)
+
+    return results
+
+
+def compare(results, baseline, threshold):
+    """ Compare results against a baseline
+
+        @param results dict : Time per call, keyed by benchmark name
+        @param baseline dict : Baseline time per call, keyed by benchmark name
+        @param threshold float : Slowdown ratio above which a benchmark is
+            counted as a regression
+
+        @returns list : (name, ratio) for each regression
+    """
+
+    regressions = []
+
+    for name in sorted(results):
+        if name not in baseline:
+            continue
+        ratio = results[name] / baseline[name]
+        flag = ''
+        if ratio > threshold:
+            regressions.append((name, ratio))
+            flag = '  REGRESSION'
+        print('{0:<70} {1:>8.2f}x{2}'.format(name, ratio, flag))
+
+    return regressions
+
+
+def _metadata():
+    """ Describe the environment the benchmarks ran in """
+
+    return {
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'scipy': dsp.HAS_SCIPY,
+        'soundfile': wavfile.HAS_SOUNDFILE,
+    }
+
+
+def main():
+    """ main """
+
+    parser = argparse.ArgumentParser(description='osc_gen benchmarks')
+    parser.add_argument('-o', '--output', default=DEFAULT_OUTPUT,
+                        help='File to write results to (default: %(default)s)')
+    parser.add_argument('-b', '--baseline', default=DEFAULT_BASELINE,
+                        help='Baseline file to compare against '
+                        '(default: %(default)s)')
+    parser.add_argument('--save-baseline', action='store_true',
+                        help='Write the results to the baseline file')
+    parser.add_argument('-t', '--threshold', type=float, default=1.25,
+                        help='Slowdown ratio counted as a regression '
+                        '(default: %(default)s)')
+    parser.add_argument('-k', '--keyword',
+                        help='Only run benchmarks with names containing this')
+    parser.add_argument('--quick', action='store_true',
+                        help='Use fewer, smaller sizes')
+    parser.add_argument('--min-time', type=float, default=0.2,
+                        help='Minimum duration of each timing run in seconds '
+                        '(default: %(default)s)')
+    args = parser.parse_args()
+
+    results = run(args.quick, args.keyword, args.min_time)
+    report = {'metadata': _metadata(), 'results': results}
+
+    with open(args.output, 'w') as out_file:
+        json.dump(report, out_file, indent=2, sort_keys=True)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as out_file:
+            json.dump(report, out_file, indent=2, sort_keys=True)
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print('No baseline found at {0}'.format(args.baseline))
+        return 0
+
+    with open(args.baseline) as in_file:
+        baseline = json.load(in_file)['results']
+
+    print()
+    regressions = compare(results, baseline, args.threshold)
+
+    if regressions:
+        print('\n{0} regression(s) above {1}x'.format(
+            len(regressions), args.threshold))
+        return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+"""
+Copyright 2019 Harvey Ormston
+
+This file is part of osc_gen.
+
+    osc_gen is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    osc_gen is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with osc_gen.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from collections import OrderedDict
+from contextlib import contextmanager
+import hashlib
+import os
+import tempfile
+import threading
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# atomic on all platforms where available
+_replace = getattr(os, 'replace', os.rename)
+
+
+class LRUCache(object):
+    """ A size-bounded mapping which discards the least recently used item
+    when full, and counts lookup hits and misses """
+
+    def __init__(self, maxsize=128):
+        """
+        Init
+
+        @param maxsize int : Maximum number of items to hold
+        """
+
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key, default=None):
+        """ Get an item, marking it as most recently used
+
+            @param key hashable : Item key
+            @param default object : Value to return if the key is not present
+        """
+
+        with self._lock:
+            try:
+                value = self._data.pop(key)
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data[key] = value
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """ Add an item, discarding the least recently used items if the
+            cache is full
+
+            @param key hashable : Item key
+            @param value object : Item value
+        """
+
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = value
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        """ Remove all items and reset the hit and miss counters """
+
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def info(self):
+        """ Get cache statistics
+
+            @returns dict : hits, misses, size and maxsize
+        """
+
+        return {'hits': self.hits, 'misses': self.misses,
+                'size': len(self._data), 'maxsize': self.maxsize}
+
+
+def digest(*parts):
+    """ Hash a description of some content, such as the parameters used to
+        generate a wavetable, to a hex string. Parts may be numbers, strings,
+        arrays, or lists, tuples and dicts of these, and are hashed by value.
+
+        @param parts : Values to hash
+    """
+
+    sha = hashlib.sha1()
+
+    def update(part):
+        """ Add a single part to the hash, tagged by type """
+
+        if isinstance(part, np.ndarray):
+            sha.update(repr(('array', part.dtype.str, part.shape)).encode())
+            sha.update(np.ascontiguousarray(part).tobytes())
+        elif isinstance(part, (list, tuple)):
+            sha.update(repr(('seq', len(part))).encode())
+            for item in part:
+                update(item)
+        elif isinstance(part, dict):
+            sha.update(repr(('dict', len(part))).encode())
+            for key in sorted(part, key=repr):
+                update(key)
+                update(part[key])
+        else:
+            sha.update(repr(part).encode())
+
+    update(parts)
+
+    return sha.hexdigest()
+
+
+def file_digest(filename, chunk_size=1 << 20):
+    """ Hash the contents of a file to a hex string
+
+        @param filename str : File name
+        @param chunk_size int : Number of bytes to read at a time
+    """
+
+    sha = hashlib.sha1()
+
+    with open(filename, 'rb') as handle:
+        for chunk in iter(lambda: handle.read(chunk_size), b''):
+            sha.update(chunk)
+
+    return sha.hexdigest()
+
+
+class DiskCache(object):
+    """ A size-bounded store of arrays in .npy files, named by a hash of
+    their key. Files are replaced atomically, so several processes can share
+    a cache directory, and the least recently used files are deleted when the
+    total size exceeds the limit. Arrays are returned memory-mapped. """
+
+    def __init__(self, directory, max_bytes=1 << 30):
+        """
+        Init
+
+        @param directory str : Cache directory, which is created if it
+            doesn't exist
+        @param max_bytes int : Maximum total size of the cached files
+        """
+
+        self.directory = os.path.expanduser(directory)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+        if not os.path.isdir(self.directory):
+            try:
+                os.makedirs(self.directory)
+            except OSError:
+                # created by another process
+                if not os.path.isdir(self.directory):
+                    raise
+
+    def _path(self, key):
+        """ Get the file name for a key """
+
+        return os.path.join(self.directory, digest(key) + '.npy')
+
+    @contextmanager
+    def _locked(self):
+        """ Hold an exclusive lock on the cache directory, where supported,
+            so that only one process evicts files at a time """
+
+        if fcntl is None:
+            yield
+            return
+
+        with open(os.path.join(self.directory, '.lock'), 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def get(self, key, default=None):
+        """ Get a read-only, memory-mapped array, marking it as most recently
+            used
+
+            @param key : Key, hashed as by digest()
+            @param default object : Value to return if the key is not present
+        """
+
+        path = self._path(key)
+
+        try:
+            value = np.load(path, mmap_mode='r')
+            os.utime(path, None)
+        except (IOError, OSError, ValueError):
+            # missing, or evicted by another process
+            self.misses += 1
+            return default
+
+        self.hits += 1
+
+        return value
+
+    def put(self, key, value):
+        """ Store an array, discarding the least recently used arrays if the
+            cache is full
+
+            @param key : Key, hashed as by digest()
+            @param value np.ndarray : Array to store
+        """
+
+        path = self._path(key)
+        handle, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+
+        try:
+            with os.fdopen(handle, 'wb') as tmp_file:
+                np.save(tmp_file, np.asarray(value))
+            _replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+        with self._locked():
+            self._evict()
+
+    def _files(self):
+        """ Get (mtime, size, path) for each cached file, oldest first """
+
+        files = []
+
+        for name in os.listdir(self.directory):
+            if not name.endswith('.npy'):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+
+        return sorted(files)
+
+    def _evict(self):
+        """ Delete the least recently used files until the total size is
+            within the limit """
+
+        files = self._files()
+        total = sum(size for _, size, _ in files)
+
+        for _, size, path in files:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                # removed by another process, or in use on Windows
+                continue
+            total -= size
+
+    def clear(self):
+        """ Delete all cached files and reset the hit and miss counters """
+
+        with self._locked():
+            for _, _, path in self._files():
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+        self.hits = 0
+        self.misses = 0
+
+    def info(self):
+        """ Get cache statistics
+
+            @returns dict : hits, misses, size, bytes and max_bytes, where
+                size is the number of cached files and bytes is their total
+                size
+        """
+
+        files = self._files()
+
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(files),
+                'bytes': sum(size for _, size, _ in files),
+                'max_bytes': self.max_bytes}
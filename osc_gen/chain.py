@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+Copyright 2019 Harvey Ormston
+
+This file is part of osc_gen.
+
+    osc_gen is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    osc_gen is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with osc_gen.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from __future__ import division
+
+import hashlib
+
+import numpy as np
+
+from osc_gen import cache
+from osc_gen import dsp
+from osc_gen import instrument
+
+# intermediate results, keyed by source content and the operations applied
+CACHE = cache.LRUCache(maxsize=256)
+
+# for each operation: whether the eager dsp function normalizes its output,
+# and whether normalizing the input first can be skipped because the
+# operation commutes with a change of offset and positive gain
+_OPS = {
+    'clip': (True, False),
+    'tube': (True, False),
+    'fold': (True, False),
+    'shape': (True, False),
+    'quantize': (True, False),
+    'slew': (True, True),
+    'downsample': (True, True),
+    'band_limit': (False, False),
+}
+
+
+def _key(data):
+    """ Build a cache key from the contents of a source array """
+
+    data = np.ascontiguousarray(data)
+    digest = hashlib.sha1(data.tobytes()).hexdigest()
+
+    return (digest, data.dtype.str, data.shape)
+
+
+def _run(operation, block, pending):
+    """ Apply a single operation to a block of cycles
+
+        @param operation tuple : Operation name followed by its arguments
+        @param block np.ndarray : A (cycles, samples) array, which may be
+            modified in place
+        @param pending bool : True if the block is yet to be normalized
+
+        @returns (np.ndarray, bool) : The result and whether it is yet to be
+            normalized
+    """
+
+    normalizes, deferrable = _OPS[operation[0]]
+
+    if pending and not deferrable:
+        dsp.normalize(block)
+
+    return dsp.KERNELS[operation[0]](block, *operation[1:]), normalizes
+
+
+class Chain(object):
+    """ A lazily evaluated sequence of dsp operations on a set of wave
+    cycles. Each operation returns a new Chain, so variants can be branched
+    from a common chain and the shared part is only evaluated once. The
+    source is never modified. """
+
+    def __init__(self, source, lru=CACHE):
+        """
+        Init
+
+        @param source np.ndarray or WaveTable : A single cycle, a 2D array of
+            cycles, or a wavetable
+        @param lru LRUCache : Cache to use for intermediate results, or None
+            to disable caching
+        """
+
+        self.source = source
+        self.lru = lru
+
+        self._parent = None
+        self._op = None
+        self._branches = 0
+
+    def _then(self, name, *args):
+        """ Get a new chain which applies an operation after this one """
+
+        # pylint: disable=protected-access
+        # links between chains are private to the class
+        node = Chain(self.source, self.lru)
+        node._parent = self
+        node._op = (name,) + args
+        self._branches += 1
+
+        return node
+
+    def clip(self, amount, bias=0):
+        """ Hard-clip. See dsp.clip """
+
+        return self._then('clip', amount, bias)
+
+    def tube(self, amount, bias=0):
+        """ Tube saturate. See dsp.tube """
+
+        return self._then('tube', amount, bias)
+
+    def fold(self, amount, bias=0):
+        """ Perform wave folding. See dsp.fold """
+
+        return self._then('fold', amount, bias)
+
+    def shape(self, amount=1, bias=0, power=3):
+        """ Perform polynomial waveshaping. See dsp.shape """
+
+        return self._then('shape', amount, bias, power)
+
+    def slew(self, rate, inv=False):
+        """ Apply slew or overshoot. See dsp.slew """
+
+        return self._then('slew', rate, inv)
+
+    def downsample(self, factor):
+        """ Reduce the effective sample rate. See dsp.downsample """
+
+        if factor < 1:
+            raise ValueError(
+                "Downsampling factor ({0}) cannot be < 1".format(factor))
+
+        if factor == 1:
+            return self
+
+        return self._then('downsample', factor)
+
+    def quantize(self, depth):
+        """ Reduce the bit depth. See dsp.quantize """
+
+        return self._then('quantize', depth)
+
+    def band_limit(self, max_harmonic):
+        """ Remove harmonics above a given harmonic. See dsp.band_limit """
+
+        return self._then('band_limit', max_harmonic)
+
+    def _nodes(self):
+        """ Get the chains leading to this one, excluding the source """
+
+        # pylint: disable=protected-access
+        nodes = []
+        node = self
+
+        while node._parent is not None:
+            nodes.append(node)
+            node = node._parent
+
+        return nodes[::-1]
+
+    @property
+    def ops(self):
+        """ The operations applied by the chain, as tuples of the operation
+        name followed by its arguments """
+
+        # pylint: disable=protected-access
+        return tuple(node._op for node in self._nodes())
+
+    def _source_array(self):
+        """ Get the source cycles as an array """
+
+        if hasattr(self.source, 'as_array'):
+            return self.source.as_array()
+
+        return np.asarray(self.source)
+
+    @instrument.stage('Chain.evaluate')
+    def evaluate(self, batch=None):
+        """ Evaluate the chain. Operations are applied to each batch of cycles
+        in turn, and normalization is only applied where it changes the
+        result, so the output matches applying the dsp functions one by one.
+        The results of chains which have been branched are cached.
+
+        @param batch int : Maximum number of cycles to process at once, or
+            None to process all cycles together
+
+        @returns np.ndarray : Processed cycles, with the same shape as the
+            source. The result is cached, so it is read-only.
+        """
+
+        # pylint: disable=protected-access
+        # links between chains are private to the class, and the working
+        # dtype follows the same rule as the eager dsp functions
+        data = self._source_array()
+        nodes = self._nodes()
+        ops = tuple(node._op for node in nodes)
+        key = _key(data) if self.lru is not None else None
+
+        # start from the longest evaluated prefix
+        start = 0
+        state = (data, False)
+        if key is not None:
+            for i in range(len(ops), 0, -1):
+                hit = self.lru.get((key, ops[:i]))
+                if hit is not None:
+                    start = i
+                    state = hit
+                    break
+
+        if ops and start == len(ops) and not state[1]:
+            return state[0]
+
+        outp = np.array(state[0], dtype=dsp._float_dtype(state[0]))
+        cycles = np.atleast_2d(outp)
+        size = cycles.shape[0]
+        batch = size if batch is None else max(int(batch), 1)
+
+        # intermediate results which are shared by more than one branch
+        saved = {}
+        if key is not None:
+            saved = dict((i + 1, np.empty_like(cycles))
+                         for i in range(start, len(ops) - 1)
+                         if nodes[i]._branches > 1)
+
+        for first in range(0, size, batch):
+
+            rows = slice(first, first + batch)
+            block = cycles[rows]
+            pending = state[1]
+
+            for i in range(start, len(ops)):
+                with instrument.span('chain.' + ops[i][0], block.nbytes):
+                    block, pending = _run(ops[i], block, pending)
+                if i + 1 in saved:
+                    saved[i + 1][rows] = block
+
+            if pending:
+                dsp.normalize(block)
+
+            if not np.may_share_memory(block, cycles):
+                cycles[rows] = block
+
+        for i, arr in saved.items():
+            arr = arr.reshape(outp.shape)
+            arr.flags.writeable = False
+            self.lru.put((key, ops[:i]), (arr, _OPS[ops[i - 1][0]][0]))
+
+        if key is not None:
+            outp.flags.writeable = False
+            self.lru.put((key, ops), (outp, False))
+
+        return outp
+
+    def apply(self, wavetable=None, batch=None):
+        """ Evaluate the chain and store the result in a wavetable
+
+        @param wavetable WaveTable : Wavetable to store the result in. Defaults
+            to the source of the chain.
+        @param batch int : Maximum number of cycles to process at once
+
+        @returns WaveTable : The wavetable
+        """
+
+        if wavetable is None:
+            wavetable = self.source
+
+        if not hasattr(wavetable, 'waves'):
+            raise ValueError("The chain has no wavetable to apply to")
+
+        wavetable.waves = np.array(self.evaluate(batch))
+
+        return wavetable
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Copyright 2019 Harvey Ormston
+
+This file is part of osc_gen.
+
+    osc_gen is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    osc_gen is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with osc_gen.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# Library-wide settings.
+#
+# DTYPE is the floating point type of the arrays created by the library.
+# While it is None, the default, arrays are float64, except for the cycles
+# generated directly from the single precision base ramp, such as saw and
+# sqr, which stay float32 as they always have. float32 is plenty for audio
+# and halves the memory used by large wavetables and batches, so it can be
+# chosen for the whole library or for a block of code. Functions which
+# create arrays also take a dtype argument, which overrides it for that call.
+#
+#     config.set_dtype(np.float32)
+#
+#     with config.use_dtype(np.float32):
+#         waves = sig.SigGen().sin_batch(harmonic=range(16))
+
+from contextlib import contextmanager
+
+import numpy as np
+
+DTYPE = None
+
+
+def _check_dtype(dtype):
+    """ Check that a dtype is a floating point type
+
+        @param dtype : Anything accepted by np.dtype
+
+        @returns np.dtype : dtype
+    """
+
+    dtype = np.dtype(dtype)
+
+    if dtype.kind != 'f':
+        raise ValueError(
+            "Expected a floating point dtype, got {0}".format(dtype))
+
+    return dtype
+
+
+def get_dtype(dtype=None, default=np.float64):
+    """ Get the dtype to use for new arrays
+
+        @param dtype : A per-call override, or None to use the library-wide
+            setting
+        @param default : The dtype to use if neither is set
+    """
+
+    if dtype is not None:
+        return _check_dtype(dtype)
+
+    if DTYPE is not None:
+        return DTYPE
+
+    return np.dtype(default)
+
+
+def set_dtype(dtype):
+    """ Set the library-wide dtype for new arrays
+
+        @param dtype : A floating point dtype, e.g. np.float32 or np.float64,
+            or None to restore the default behaviour
+    """
+
+    global DTYPE
+    DTYPE = None if dtype is None else _check_dtype(dtype)
+
+
+@contextmanager
+def use_dtype(dtype):
+    """ Set the library-wide dtype for new arrays within a block """
+
+    previous = DTYPE
+    set_dtype(dtype)
+
+    try:
+        yield get_dtype()
+    finally:
+        set_dtype(previous)
@@ -20,137 +20,323 @@ This file is part of osc_gen.
 
 from __future__ import division
 
-import math
-from copy import deepcopy
-
 import numpy as np
 
+from osc_gen import config
+from osc_gen import instrument
+from osc_gen import pitch
+from osc_gen import scratch
+
+try:
+    from scipy.signal import lfilter
+    HAS_SCIPY = True
+except ImportError:
+    HAS_SCIPY = False
+
+
+# the maximum number of input samples used by harmonic_series
+HARMONIC_SERIES_LEN = 501 * 64
+
+# Functions which process wave cycles take an optional out array. If it is
+# given, the result is written to it and returned, and the input is left
+# unchanged unless it is out. Otherwise, normalize, clip, tube, fold, shape,
+# downsample and quantize modify and return their input, while mix,
+# one_pole, slew, band_limit and additive return a new array. Temporary
+# arrays are taken from SCRATCH, so that repeated calls on cycles of the
+# same shape, with an out array, don't allocate memory for samples. The
+# exceptions are band_limit and additive, which need FFT buffers, and
+# one_pole and slew when scipy's lfilter is used.
+SCRATCH = scratch.BufferPool()
+
 
 class NotEnoughSamplesError(Exception):
     """ Not Enough Samples """
 
 
-def normalize(inp):
+def _float_dtype(inp):
+    """ Get the dtype of arrays derived from an input: the dtype of the input
+        if it is floating point, otherwise config.DTYPE """
+
+    if np.issubdtype(inp.dtype, np.floating):
+        return inp.dtype
+
+    return config.get_dtype()
+
+
+def _prepare(inp, out):
+    """ Get the array to write the result of an in-place function to: out,
+        holding a copy of the input, if it is given, otherwise the input """
+
+    if out is None:
+        return inp
+
+    if out is not inp:
+        np.copyto(out, inp)
+
+    return out
+
+
+def normalize(inp, out=None):
     """ Normalize a signal to the range +/- 1
 
-        @param inp seq : A sequence of samples
+        @param inp seq : A sequence of samples, or a 2D array in which each
+            row is normalized independently
+        @param out np.ndarray : Array to write the result to. Defaults to
+            the input, which is normalized in place.
     """
 
-    dc_bias = (np.amax(inp) + np.amin(inp)) / 2
-    inp -= dc_bias
-    amp = np.amax(np.absolute(inp))
+    if out is None:
+        out = inp
 
-    if amp > 0:
-        inp /= amp
+    shape = np.shape(inp)[:-1] + (1,)
 
-    return inp
+    with SCRATCH.borrow(shape, out.dtype) as high, \
+            SCRATCH.borrow(shape, out.dtype) as low:
+
+        # remove the dc bias, the centre of the range
+        np.amax(inp, axis=-1, keepdims=True, out=high)
+        np.amin(inp, axis=-1, keepdims=True, out=low)
+        high += low
+        high /= 2
+        np.subtract(inp, high, out=out)
 
+        # divide by the peak amplitude, max(abs(out)), which is found
+        # without a temporary array
+        np.amax(out, axis=-1, keepdims=True, out=high)
+        np.amin(out, axis=-1, keepdims=True, out=low)
+        np.negative(low, out=low)
+        np.maximum(high, low, out=high)
+        np.divide(out, high, out=out, where=high > 0)
 
-def mix(inp_a, inp_b, amount=0.5):
+    return out
+
+
+def mix(inp_a, inp_b, amount=0.5, out=None):
     """ Mix two signals together.
 
         @param inp_a np.ndarray : first input
         @param inp_b np.ndarray : seconds input
         @param amount float : mix amount, 0 outputs only inp_a, 1 outputs only
             inp_b, values between 0 and 1 output a propotional mix of the two.
+        @param out np.ndarray : Array to write the result to, which may be
+            one of the inputs. Defaults to a new array.
     """
 
-    amount = np.clip(amount, 0, 1)
+    amount = float(np.clip(amount, 0, 1))
+    inp_a = np.asarray(inp_a)
+    inp_b = np.asarray(inp_b)
+
+    if out is None:
+        shape = np.broadcast(inp_a, inp_b).shape
+        out = np.empty(shape, dtype=np.result_type(_float_dtype(inp_a),
+                                                   _float_dtype(inp_b)))
 
-    return normalize((inp_a * (1 - amount) + inp_b * amount))
+    with SCRATCH.borrow(out.shape, out.dtype) as scaled_b:
+        np.multiply(inp_b, amount, out=scaled_b)
+        np.multiply(inp_a, 1 - amount, out=out)
+        out += scaled_b
 
+    return normalize(out)
 
-def clip(inp, amount, bias=0):
+
+@instrument.stage('dsp.clip')
+def clip(inp, amount, bias=0, out=None):
     """ Hard-clip a signal
 
-        @param inp seq : A sequence of samples
+        @param inp seq : A sequence of samples, or a 2D array of cycles
         @param amount number : Amount of clipping
         @param bias number : Pre-distortion DC bias
+        @param out np.ndarray : Array to write the result to. Defaults to
+            the input, which is modified in place.
     """
 
+    return normalize(_clip(_prepare(inp, out), amount, bias))
+
+
+def _clip(inp, amount, bias=0):
+    """ Hard-clip a signal in place, without normalizing the result """
+
     gain = 1 + amount
 
     inp += bias
     inp *= gain
     np.clip(inp, -1., 1., out=inp)
 
-    return normalize(inp)
+    return inp
 
 
-def tube(inp, amount, bias=0):
+@instrument.stage('dsp.tube')
+def tube(inp, amount, bias=0, out=None):
     """ Tube saturate a signal
 
-        @param inp seq : A sequence of samples
+        @param inp seq : A sequence of samples, or a 2D array of cycles
         @param amount number : Amount of distortion
         @param bias number : Pre-distortion DC bias
+        @param out np.ndarray : Array to write the result to. Defaults to
+            the input, which is modified in place.
     """
 
+    return normalize(_tube(_prepare(inp, out), amount, bias))
+
+
+def _tube(inp, amount, bias=0):
+    """ Tube saturate a signal in place, without normalizing the result """
+
     gain = 1 + amount
     inp += bias
     inp *= gain
-    for i, val in enumerate(inp):
-        inp[i] = math.exp(-np.logaddexp(0, -val))
+    # logistic function, evaluated in a numerically stable form
+    np.negative(inp, out=inp)
+    np.logaddexp(0, inp, out=inp)
+    np.negative(inp, out=inp)
+    np.exp(inp, out=inp)
 
-    return normalize(inp)
+    return inp
 
 
-def fold(inp, amount, bias=0):
+@instrument.stage('dsp.fold')
+def fold(inp, amount, bias=0, out=None):
     """ Perform wave folding
 
-        @param inp seq : A sequence of samples
+        @param inp seq : A sequence of samples, or a 2D array of cycles
         @param amount number : Amount of distortion
         @param bias number : Pre-distortion DC bias
+        @param out np.ndarray : Array to write the result to. Defaults to
+            the input, which is modified in place.
     """
 
+    return normalize(_fold(_prepare(inp, out), amount, bias))
+
+
+def _fold(inp, amount, bias=0):
+    """ Perform wave folding in place, without normalizing the result """
+
     gain = 1 + amount
     inp += bias
     inp *= gain
-    while (np.amax(np.abs(inp))) > 1:
-        for i, val in enumerate(inp):
-            if val > 1:
-                inp[i] = 2 - val
-            if val < -1:
-                inp[i] = -2 - val
+    # repeatedly reflecting about +/- 1 is equivalent to a triangle wave
+    # with a period of 4
+    inp -= 1
+    np.mod(inp, 4, out=inp)
+    inp -= 2
+    np.absolute(inp, out=inp)
+    inp -= 1
 
-    return normalize(inp)
+    return inp
 
 
-def shape(inp, amount=1, bias=0, power=3):
+@instrument.stage('dsp.shape')
+def shape(inp, amount=1, bias=0, power=3, out=None):
     """ Perform polynomial waveshaping
 
-        @param inp seq : A sequence of samples
+        @param inp seq : A sequence of samples, or a 2D array of cycles
         @param amount number : Amount of shaping
             (1: maximum shaping, 0: no shaping)
         @param bias number : Pre-distortion DC bias
         @param power number : Polynomial power
+        @param out np.ndarray : Array to write the result to. Defaults to
+            the input, which is modified in place.
     """
 
-    biased = inp + bias
+    return normalize(_shape(_prepare(inp, out), amount, bias, power))
+
+
+def _shape(inp, amount=1, bias=0, power=3):
+    """ Perform polynomial waveshaping in place, without normalizing the
+        result """
 
-    # make another copy to apply polynomial shaping to the biased input
-    shaped = np.empty_like(biased)
-    # shape positive and negative halves of the signal symmetrically
-    shaped[biased >= 0] = np.power(biased[biased >= 0], power) * amount
-    shaped[biased < 0] = -np.power(-biased[biased < 0], power) * amount
-    # de-bais
-    shaped -= bias
-    normalize(shaped)
+    with SCRATCH.borrow(inp.shape, inp.dtype) as shaped, \
+            SCRATCH.borrow(inp.shape, inp.dtype) as magnitude:
 
-    inp *= (1 - amount)
-    inp += shaped * amount
+        np.add(inp, bias, out=shaped)
 
-    return normalize(inp)
+        # shape positive and negative halves of the signal symmetrically
+        np.absolute(shaped, out=magnitude)
+        np.power(magnitude, power, out=magnitude)
+        np.copysign(magnitude, shaped, out=shaped)
+        shaped *= amount
+        # de-bais
+        shaped -= bias
+        normalize(shaped)
 
+        inp *= (1 - amount)
+        shaped *= amount
+        inp += shaped
 
-def slew(inp, rate, inv=False):
+    return inp
+
+
+def one_pole(inp, gain, feedback, init=0, out=None):
+    """ Apply a one-pole recursive filter to a signal, such that:
+
+        out[n] = gain * inp[n] + feedback * out[n - 1]
+
+        The filter is applied along the last axis, so a 2D array is filtered
+        as a batch of independent signals. scipy's lfilter is used if it is
+        available, otherwise the recursion is evaluated using a pure numpy
+        parallel prefix scan.
+
+        @param inp np.ndarray : A sequence of samples, or a 2D array of
+            signals
+        @param gain float : Input gain
+        @param feedback float : Feedback gain
+        @param init number or np.ndarray : Output preceding the first sample,
+            out[-1]. For a batch, one value may be given per signal.
+        @param out np.ndarray : Array to write the result to, which may be
+            the input. Defaults to a new array.
+    """
+
+    inp = np.asarray(inp)
+    dtype = _float_dtype(inp)
+
+    init = np.broadcast_to(init, inp.shape[:-1])[..., np.newaxis]
+
+    if HAS_SCIPY:
+        outp, _ = lfilter([gain], [1, -feedback], inp, axis=-1,
+                          zi=feedback * init)
+        if out is None:
+            return outp.astype(dtype, copy=False)
+        np.copyto(out, outp)
+        return out
+
+    if out is None:
+        out = np.empty(inp.shape, dtype=dtype)
+
+    np.multiply(inp, gain, out=out)
+    out[..., :1] += feedback * init
+
+    # after each step, every output sample includes the contribution of
+    # twice as many previous inputs, so log2(n) steps complete the recursion
+    coeff = feedback
+    shift = 1
+    while shift < out.shape[-1] and coeff != 0:
+        out[..., shift:] += coeff * out[..., :-shift]
+        coeff *= coeff
+        shift *= 2
+
+    return out
+
+
+@instrument.stage('dsp.slew')
+def slew(inp, rate, inv=False, out=None):
     """ Apply slew or overhoot to a signal. Slew smooths steep transients in
         the signal while overshoot results in a sharper transient with
         ringing.
 
         @param rate float : Slew rate, between 0 and 1
-        @param inp seq : A sequence of samples
+        @param inp seq : A sequence of samples, or a 2D array in which each
+            row is a single cycle
         @param inv bool : If True, overshoot will be applied. if False,
                           slew will be applied. (default=False).
+        @param out np.ndarray : Array to write the result to, which may be
+            the input. Defaults to a new array.
+    """
+
+    return normalize(_slew(inp, rate, inv, out))
+
+
+def _slew(inp, rate, inv=False, out=None):
+    """ Apply slew or overshoot to a signal, without normalizing the result
     """
 
     if inv:
@@ -160,61 +346,145 @@ def slew(inp, rate, inv=False):
 
     alpha = 1 - beta
 
+    inp = np.asarray(inp)
+    size = inp.shape[-1]
+    dtype = _float_dtype(inp)
+
+    if out is None:
+        out = np.empty(inp.shape, dtype=dtype)
+
     # the output is the middle cycle of 3, shifted slightly to account for
     # filter run-in
-    start = inp.size - 2
-    end = (2 * inp.size) - 2
+    start = size - 2
+    end = (2 * size) - 2
+
+    tiled_shape = inp.shape[:-1] + (3 * size,)
 
-    tiled_inp = np.tile(inp, 3)
+    with SCRATCH.borrow(tiled_shape, dtype) as tiled, \
+            SCRATCH.borrow(tiled_shape, dtype) as filtered:
 
-    for idx, sample in enumerate(tiled_inp[1:]):
-        tiled_inp[idx] = (sample * beta) + (tiled_inp[idx - 1] * alpha)
+        for i in range(3):
+            tiled[..., i * size:(i + 1) * size] = inp
 
-    return normalize(tiled_inp[start:end])
+        one_pole(tiled[..., 1:], beta, alpha, init=tiled[..., -1],
+                 out=filtered[..., 1:])
+        out[...] = filtered[..., start + 1:end + 1]
 
+    return out
 
-def downsample(inp, factor):
+
+@instrument.stage('dsp.downsample')
+def downsample(inp, factor, out=None):
     """ Reduce the effective sample rate of a signal, resulting in aliasing.
 
-        @param inp seq : A sequence of samples
+        @param inp seq : A sequence of samples, or a 2D array of cycles
         @param factor int : Downsampling factor
+        @param out np.ndarray : Array to write the result to. Defaults to
+            the input, which is modified in place.
     """
 
     if factor < 1:
         raise ValueError(
             "Downsampling factor ({0}) cannot be < 1".format(factor))
 
+    inp = _prepare(inp, out)
+
     if factor == 1:
         return inp
 
+    return normalize(_downsample(inp, factor))
+
+
+def _downsample(inp, factor):
+    """ Reduce the effective sample rate of a signal in place, without
+        normalizing the result """
+
     # the aliasing is deliberate!
-    for i, val in enumerate(inp):
-        if i % factor == 0:
-            last = val
-        else:
-            inp[i] = last
+    held = np.arange(inp.shape[-1])
+    held -= held % factor
 
-    return normalize(inp)
+    with SCRATCH.borrow(inp.shape, inp.dtype) as tmp:
+        # out is buffered in the default 'raise' mode
+        np.take(inp, held, axis=-1, out=tmp, mode='clip')
+        inp[...] = tmp
+
+    return inp
 
 
-def quantize(inp, depth):
+@instrument.stage('dsp.quantize')
+def quantize(inp, depth, out=None):
     """ Reduce the bit depth of a signal.
 
-        @param inp seq : A sequence of samples
+        @param inp seq : A sequence of samples, or a 2D array of cycles
         @param depth number : New bit depth in bits
+        @param out np.ndarray : Array to write the result to. Defaults to
+            the input, which is modified in place.
     """
 
+    return normalize(_quantize(_prepare(inp, out), depth))
+
+
+def _quantize(inp, depth):
+    """ Reduce the bit depth of a signal in place, without normalizing the
+        result """
+
     scale = 2 ** depth - 1
 
-    for i, val in enumerate(inp):
-        if val > 0:
-            inp[i] = np.ceil(val * scale) / scale
-        elif val < 0:
-            inp[i] = np.floor(val * scale) / scale
+    # round away from zero
+    with SCRATCH.borrow(inp.shape, inp.dtype) as sign:
+        np.copyto(sign, inp)
+        np.absolute(inp, out=inp)
+        inp *= scale
+        np.ceil(inp, out=inp)
+        np.copysign(inp, sign, out=inp)
+        inp /= scale
+
+    return inp
+
+
+@instrument.stage('dsp.band_limit')
+def band_limit(inp, max_harmonic, out=None):
+    """ Remove all harmonics above a given harmonic from periodic wave cycles
+        by zeroing them in the frequency domain.
+
+        @param inp np.ndarray : A single wave cycle, or a 2D array of cycles
+        @param max_harmonic int : Highest harmonic to keep, where 1 is the
+            fundamental
+        @param out np.ndarray : Array to write the result to, which may be
+            the input. Defaults to a new array.
+    """
+
+    inp = np.asarray(inp)
+    dtype = _float_dtype(inp)
+
+    spectrum = np.fft.rfft(inp, axis=-1)
+    spectrum[..., max_harmonic + 1:] = 0
+    limited = np.fft.irfft(spectrum, n=inp.shape[-1], axis=-1)
+
+    if out is None:
+        return limited.astype(dtype, copy=False)
+
+    np.copyto(out, limited)
 
-    return normalize(inp)
+    return out
 
 
+# kernels which process a 2D array of cycles in place, without normalizing
+# the result, keyed by the name of the eager function they implement, for
+# use by chain
+KERNELS = {
+    'clip': _clip,
+    'tube': _tube,
+    'fold': _fold,
+    'shape': _shape,
+    'quantize': _quantize,
+    'slew': _slew,
+    'downsample': _downsample,
+    'band_limit': band_limit,
+}
+
+
+@instrument.stage('dsp.fundamental')
 def fundamental(inp, fs):
     """ Find the fundamental frequency in Hz of a given input """
 
@@ -226,91 +496,321 @@ def fundamental(inp, fs):
     return np.abs(freqs[i] * fs)
 
 
+@instrument.stage('dsp.harmonic_series')
 def harmonic_series(inp):
-    """ Find the harmonic series of a periodic input """
+    """ Find the harmonic series of a periodic input
+
+        @param inp np.ndarray : A signal, or a (sections, samples) array of
+            signals which are analysed with a single batched FFT. Each row of
+            the result is then padded with zeros to the length of the
+            longest series.
+    """
+
+    inp = np.asarray(inp)
+    batch = np.atleast_2d(inp)
+    size = batch.shape[-1]
+    dtype = _float_dtype(inp)
 
-    fft_mult = min(64, inp.size // 501)
+    fft_mult = min(64, size // 501)
     fft_mult = max(fft_mult, 1)
     fft_len = 501 * fft_mult
 
-    # if the input has insufficient data, loop it a number of times
-    while inp.size < fft_len:
-        inp = np.tile(inp, 2)
+    # if the input has insufficient data, loop it
+    if size < fft_len:
+        batch = batch[:, np.arange(fft_len) % size]
 
     # produce symmetrical, windowed fft
     idx1 = int(np.floor((fft_len + 1) / 2))
     idx2 = int(np.floor(fft_len / 2))
-    windowed = inp[:fft_len] * np.hamming(fft_len)
+    windowed = batch[:, :fft_len] * np.hamming(fft_len).astype(dtype)
     fft_half = 1024 * fft_mult
-    buf = np.zeros(fft_half)
-    buf[:idx1] = windowed[idx2:]
-    buf[fft_half - idx2:] = windowed[:idx2]
-    fft = np.fft.fft(buf)[:fft_half // 2]
+    buf = np.zeros((batch.shape[0], fft_half), dtype=dtype)
+    buf[:, :idx1] = windowed[:, idx2:]
+    buf[:, fft_half - idx2:] = windowed[:, :idx2]
+    fft = np.fft.rfft(buf, axis=-1)[:, :fft_half // 2]
+    mag = np.abs(fft)
 
     # peak amplitude assumed to be fundamental frequency
-    i_fund = np.argmax(np.abs(fft))
-    i_fund = max(i_fund, 4)
+    i_funds = np.maximum(np.argmax(mag, axis=-1), 4)
+
+    series = [_pick_harmonics(row, row_mag, i_fund)
+              for row, row_mag, i_fund in zip(fft, mag, i_funds)]
+
+    if inp.ndim == 1:
+        return series[0]
+
+    harmonics = np.zeros((len(series), max(x.size for x in series)),
+                         dtype=fft.dtype)
+    for row, x in zip(harmonics, series):
+        row[:x.size] = x
+
+    return harmonics
+
+
+def _pick_harmonics(fft, mag, i_fund):
+    """ Get the fft components of the harmonics of a fundamental frequency,
+        normalized in magnitude and phase to the fundamental. Harmonics are
+        picked by taking the value with the highest amplitude around each
+        harmonic frequency.
+
+        @param fft np.ndarray : FFT of a signal, up to the Nyquist frequency
+        @param mag np.ndarray : Magnitude of the FFT
+        @param i_fund int : Index of the fundamental frequency
+    """
 
-    # get fft components from only the harmonics, harmonics are picked by
-    # taking the value with the highest amplitude around each harmonic
-    # frequency
     start = i_fund // 4
-    harmonics = np.array(
-        [fft[i - start:i + start][np.abs(fft[i - start:i + start]).argmax()]
-         for i in range(i_fund, fft_half // 2, i_fund)])
+    width = 2 * start
+    centres = np.arange(i_fund, fft.size, i_fund)
+
+    # view the bins around every harmonic as rows of a strided array, padding
+    # the end so that the last window can be full width
+    padded = np.full(fft.size + width, -1.0, dtype=mag.dtype)
+    padded[:fft.size] = mag
+    first = padded[centres[0] - start:]
+    windows = np.lib.stride_tricks.as_strided(
+        first, shape=(centres.size, width),
+        strides=(i_fund * first.strides[0], first.strides[0]),
+        writeable=False)
+
+    harmonics = fft[centres - start + np.argmax(windows, axis=-1)]
 
     # normalize magnitude and phase
     hs_amp = np.abs(harmonics)
     hs_ang = np.angle(harmonics)
-    harmonics = hs_amp * np.exp(1j * (hs_ang - hs_ang[0])) / hs_amp[0]
 
-    return harmonics
+    return hs_amp * np.exp(1j * (hs_ang - hs_ang[0])) / hs_amp[0]
 
 
-def slice_cycles(inp, n, fs):
-    """ Extact n single-cycle slices from a signal """
+@instrument.stage('dsp.slice_cycles')
+def slice_cycles(inp, n, fs, fractional=False):
+    """ Extact n single-cycle slices from a signal. The length of each slice
+        follows the pitch of the signal at that point.
 
-    def nearest(arr, val):
-        """ find the nearest value in an array to a given value """
-        return arr[np.argmin(np.abs(arr - val))]
+        @param inp np.ndarray : Signal
+        @param n int : Number of slices
+        @param fs number : Sample rate in Hz
+        @param fractional bool : If True, each slice starts at the
+            interpolated position of a zero crossing and is resampled so that
+            it spans exactly one period, rather than being truncated to a
+            whole number of samples, so that it loops without a click. All
+            slices then have the length of the overall period
+            (default False).
+    """
 
     zero_crossings = np.where(np.diff(np.sign(inp)) > 0)[0] + 1
 
     if not zero_crossings.size:
         raise ValueError("No zero crossings found.")
 
-    freq = fundamental(inp, fs)
+    freq, times, freqs = _detect_pitch(inp, fs)
     samples_per_cycle = fs / freq
-    end = len(inp) - samples_per_cycle
+    periods = fs / np.where(np.isnan(freqs), freq, freqs)
+    end = len(inp) - max(samples_per_cycle, periods.max())
 
     slots = np.linspace(0, end, n)
     slots = np.around(slots).astype(int)
-    slots = np.unique([nearest(zero_crossings, slot) for slot in slots])
+    slots = np.unique(_nearest(zero_crossings, slots))
+    periods = np.interp(slots / fs, times, periods)
 
-    return [inp[x:x + int(samples_per_cycle)] for x in slots]
+    if fractional:
+        return list(_fractional_cycles(inp, slots, periods,
+                                       int(samples_per_cycle)))
 
+    return [inp[x:x + int(p)] for x, p in zip(slots, periods)]
 
-def resynthesize(inp, sig_gen):
+
+def _detect_pitch(inp, fs):
+    """ Find the fundamental frequency and pitch track of a signal using
+        pitch.detect. Signals which are too short to be framed for pitch
+        detection fall back to a single estimate from fundamental().
+
+        @param inp np.ndarray : Signal
+        @param fs number : Sample rate in Hz
     """
-    Resynthesize a signal from its harmonic series
 
-    @param sig_gen SigGen : SigGen to use for regenerating the signal.
+    try:
+        return pitch.detect(inp, fs)
+    except ValueError:
+        freq = fundamental(inp, fs)
+        return freq, np.array([inp.size / (2 * fs)]), np.array([freq])
+
+
+def _nearest(arr, vals):
+    """ Find the nearest value in a sorted array to each of a set of values.
+        Where two values are equally near, the lower is chosen.
+
+        @param arr np.ndarray : Sorted array
+        @param vals np.ndarray : Values to look up
     """
 
-    sine_gen = deepcopy(sig_gen)
-    max_harmonic = sig_gen.num_points // 2
-    harmonics = harmonic_series(inp)
-    outp = np.zeros(sine_gen.num_points)
+    idx = np.searchsorted(arr, vals)
+    idx = np.clip(idx, 1, max(arr.size - 1, 1))
+    lower = arr[idx - 1]
+    upper = arr[np.minimum(idx, arr.size - 1)]
+
+    return np.where(upper - vals < vals - lower, upper, lower)
 
-    for i, harmonic in enumerate(harmonics):
 
-        sine_gen.harmonic = i
-        sine_gen.amp = np.abs(harmonic)
-        sine_gen.phase = np.angle(harmonic)
+def _fractional_cycles(inp, crossings, samples_per_cycle, cycle_len=None):
+    """ Extract cycles which start exactly at a rising zero crossing and span
+        exactly one period, using linear interpolation
 
-        outp += sine_gen.sin()
+        @param inp np.ndarray : Signal
+        @param crossings np.ndarray : Indices of the first sample after each
+            rising zero crossing
+        @param samples_per_cycle float : Period in samples, or an array of
+            periods for each crossing
+        @param cycle_len int : Number of samples in each cycle. Defaults to
+            the whole number of samples in the period.
+
+        @returns np.ndarray : A (crossings, cycle_len) array
+    """
 
-        if i >= max_harmonic:
-            break
+    samples_per_cycle = np.asarray(samples_per_cycle, dtype=np.float64)
+
+    if cycle_len is None:
+        cycle_len = int(samples_per_cycle)
+
+    # position of the crossing between the sample before and the sample after
+    before = inp[crossings - 1]
+    after = inp[crossings]
+    starts = crossings - 1 + before / (before - after)
+
+    steps = np.reshape(samples_per_cycle / cycle_len, (-1, 1))
+    positions = starts[:, np.newaxis] + np.arange(cycle_len) * steps
+
+    return np.interp(positions, np.arange(len(inp)), inp).astype(
+        _float_dtype(inp))
+
+
+def _harmonics_to_cycles(harmonics, num_points, dtype=None):
+    """ Synthesize wave cycles from harmonic series using an inverse FFT
+
+        @param harmonics np.ndarray : Complex amplitudes of each harmonic,
+            starting with the fundamental, where the magnitude and angle of
+            each value give the amplitude and phase of a sine wave. A 2D
+            array synthesizes one cycle per row.
+        @param num_points int : Number of samples in each cycle
+        @param dtype : Floating point dtype of the result. Defaults to
+            config.DTYPE.
+    """
+
+    harmonics = np.asarray(harmonics)
+    dtype = config.get_dtype(dtype)
+    num_bins = num_points // 2 + 1
+    num = min(harmonics.shape[-1], num_bins - 1)
+
+    # place each harmonic in the bin for its frequency, rotating the phase so
+    # that a real value corresponds to a sine rather than a cosine
+    spectrum = np.zeros(harmonics.shape[:-1] + (num_bins,),
+                        dtype=np.result_type(harmonics.dtype, dtype, 1j))
+    spectrum[..., 1:num + 1] = harmonics[..., :num] * (-0.5j * num_points)
+
+    # the Nyquist bin has no conjugate pair
+    if num_points % 2 == 0 and num == num_bins - 1:
+        spectrum[..., -1] *= 2
+
+    return np.fft.irfft(spectrum, n=num_points, axis=-1).astype(
+        dtype, copy=False)
+
+
+@instrument.stage('dsp.slice_cycles_stream')
+def slice_cycles_stream(read, size, n, fs, analysis_len=1 << 16,
+                        fractional=False):
+    """ Extact n single-cycle slices from a signal which is too large to hold
+        in memory. The fundamental frequency is found from a window in the
+        middle of the signal, then only the samples around each slice are
+        read.
+
+        @param read callable : read(start, num) returns num samples of the
+            signal, starting at index start
+        @param size int : Number of samples in the signal
+        @param n int : Number of slices
+        @param fs number : Sample rate in Hz
+        @param analysis_len int : Number of samples used to find the
+            fundamental frequency
+        @param fractional bool : If True, slices start and end at
+            interpolated positions. See slice_cycles.
+    """
+
+    analysis_len = min(analysis_len, size)
+    freq = _detect_pitch(read((size - analysis_len) // 2, analysis_len),
+                         fs)[0]
+    samples_per_cycle = fs / freq
+    cycle_len = int(samples_per_cycle)
+    margin = int(np.ceil(samples_per_cycle))
+    end = size - samples_per_cycle
+
+    slots = np.linspace(0, end, n)
+    slots = np.around(slots).astype(int)
+
+    cycles = {}
+
+    for slot in slots:
+
+        # a periodic signal crosses zero at least once per cycle, so only the
+        # cycles either side of the slot need to be read
+        start = max(slot - margin, 0)
+        window = read(start, margin * 2 + cycle_len + 1)
+        zero_crossings = np.where(np.diff(np.sign(window)) > 0)[0] + 1
+        zero_crossings = zero_crossings[
+            zero_crossings + cycle_len <= window.size]
+
+        if not zero_crossings.size:
+            continue
+
+        nearest = _nearest(zero_crossings, slot - start)
+
+        if fractional:
+            cycles[nearest + start] = _fractional_cycles(
+                window, np.array([nearest]), samples_per_cycle)[0]
+        else:
+            cycles[nearest + start] = window[nearest:nearest + cycle_len]
+
+    if not cycles:
+        raise ValueError("No zero crossings found.")
+
+    return [cycles[x] for x in sorted(cycles)]
+
+
+@instrument.stage('dsp.additive')
+def additive(harmonics, num_points, max_harmonic=None, dtype=None, out=None):
+    """ Synthesize normalized wave cycles from harmonic series
+
+        @param harmonics np.ndarray : Complex amplitudes of each harmonic,
+            starting with the fundamental, where the magnitude and angle of
+            each value give the amplitude and phase of a sine wave. A
+            (slots, harmonics) array synthesizes one cycle per row.
+        @param num_points int : Number of samples in each cycle
+        @param max_harmonic int : Highest harmonic to include, where 1 is the
+            fundamental. Harmonics above the Nyquist frequency are always
+            discarded.
+        @param dtype : Floating point dtype of the result. Defaults to
+            config.DTYPE.
+        @param out np.ndarray : Array to write the result to. Defaults to a
+            new array.
+    """
+
+    harmonics = np.asarray(harmonics)
+
+    if max_harmonic is not None:
+        harmonics = harmonics[..., :max_harmonic]
+
+    return normalize(_harmonics_to_cycles(harmonics, num_points, dtype), out)
+
+
+@instrument.stage('dsp.resynthesize')
+def resynthesize(inp, sig_gen, out=None):
+    """
+    Resynthesize a signal from its harmonic series
+
+    @param inp np.ndarray : A signal, or a 2D array of signals which are
+        resynthesized together, one cycle per row
+    @param sig_gen SigGen : SigGen to use for regenerating the signal. Its
+        number of points and dtype are used for the result.
+    @param out np.ndarray : Array to write the result to. Defaults to a new
+        array.
+    """
 
-    return normalize(outp)
+    return additive(harmonic_series(inp), sig_gen.num_points,
+                    dtype=sig_gen.dtype, out=out)
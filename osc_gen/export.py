@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Copyright 2019 Harvey Ormston
+
+This file is part of osc_gen.
+
+    osc_gen is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    osc_gen is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with osc_gen.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from multiprocessing.pool import ThreadPool
+import os
+
+import numpy as np
+
+from osc_gen import instrument
+from osc_gen import wavfile
+from osc_gen import wtfile
+from osc_gen import zosc
+
+# writers, keyed by format name. Each is called as
+# writer(waves, filename, samplerate) with a read-only (slots, wave_len)
+# array, and must not modify shared state, as writers may run concurrently.
+WRITERS = {}
+
+# format names, keyed by the file extensions they are used for by default
+EXTENSIONS = {}
+
+
+def register(name, extension=None):
+    """ Decorator which registers a writer for a format, e.g.
+
+        @export.register('raw', '.raw')
+        def write_raw(waves, filename, samplerate):
+            waves.astype('<f4').tofile(filename)
+
+        @param name str : Format name
+        @param extension str : If given, files with this extension are
+            written in this format unless a format is given
+    """
+
+    def decorator(writer):
+        WRITERS[name] = writer
+        if extension is not None:
+            EXTENSIONS[extension.lower()] = name
+        return writer
+
+    return decorator
+
+
+@register('wav', '.wav')
+def _write_wav16(waves, filename, samplerate):
+    """ Write 16 bit PCM wav """
+
+    wavfile.write(waves, filename, samplerate, 'PCM_16')
+
+
+@register('wav24')
+def _write_wav24(waves, filename, samplerate):
+    """ Write 24 bit PCM wav """
+
+    wavfile.write(waves, filename, samplerate, 'PCM_24')
+
+
+@register('wav_float')
+def _write_wav_float(waves, filename, samplerate):
+    """ Write 32 bit float wav """
+
+    wavfile.write(waves, filename, samplerate, 'FLOAT')
+
+
+@register('h2p', '.h2p')
+def _write_h2p(waves, filename, samplerate):  # pylint: disable=unused-argument
+    """ Write Zebra2 h2p """
+
+    zosc.write(waves, filename)
+
+
+@register('oscw', '.oscw')
+def _write_oscw(waves, filename, samplerate):
+    """ Write binary wavetable """
+
+    wtfile.write(waves, filename, samplerate)
+
+
+def _writer(filename, fmt):
+    """ Get the writer for a file, in a given format or, if fmt is None,
+        the format for its extension """
+
+    if fmt is None:
+        ext = os.path.splitext(filename)[1].lower()
+        if ext not in EXTENSIONS:
+            raise ValueError("No format for {0}, expected one of {1}".format(
+                filename, sorted(EXTENSIONS)))
+        fmt = EXTENSIONS[ext]
+
+    if fmt not in WRITERS:
+        raise ValueError("Unknown format {0}, expected one of {1}".format(
+            fmt, sorted(WRITERS)))
+
+    return WRITERS[fmt]
+
+
+@instrument.stage('export.export')
+def export(waves, targets, samplerate=44100, threads=None):
+    """ Write waves to several files, in any of the registered formats. The
+        waves are materialized once and shared by all of the writers.
+
+        @param waves : A WaveTable, or a (num_slots, wave_len) array
+        @param targets seq : File names, or (file name, format) pairs. The
+            format of a file name on its own is found from its extension.
+        @param samplerate int : Sample rate in Hz, for formats which store it
+        @param threads int : If given, files are written concurrently using
+            this many threads
+
+        @returns list : The file names written
+    """
+
+    targets = [(target, None) if isinstance(target, str) else tuple(target)
+               for target in targets]
+
+    # check every target before writing anything
+    jobs = [(_writer(filename, fmt), filename) for filename, fmt in targets]
+
+    if hasattr(waves, 'as_array'):
+        waves = waves.as_array()
+
+    waves = np.asarray(waves).view()
+    waves.setflags(write=False)
+
+    def write(job):
+        writer, filename = job
+        writer(waves, filename, samplerate)
+        return filename
+
+    if threads:
+        pool = ThreadPool(threads)
+        try:
+            return pool.map(write, jobs)
+        finally:
+            pool.close()
+            pool.join()
+
+    return [write(job) for job in jobs]
@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+Copyright 2019 Harvey Ormston
+
+This file is part of osc_gen.
+
+    osc_gen is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    osc_gen is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with osc_gen.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# Opt-in timing of the stages of the wavetable pipeline.
+#
+# Functions decorated with stage(), and blocks wrapped in span(), report their
+# wall time and the number of bytes they processed while a recording() is
+# active or a callback is registered. Otherwise, they only check a flag.
+#
+#     with instrument.recording() as rec:
+#         WaveTable(16, wave_len=2048).from_wav('in.wav').to_wav('out.wav')
+#     rec.summary()
+#     rec.to_chrome_trace('trace.json')
+
+from __future__ import division
+
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+ENABLED = False
+
+_RECORDERS = []
+_CALLBACKS = []
+
+_clock = getattr(time, 'perf_counter', time.time)
+
+
+class Recorder(object):
+    """ Collects timing events """
+
+    def __init__(self):
+        """ Init """
+
+        self.events = []
+        self._lock = threading.Lock()
+
+    def add(self, event):
+        """ Add an event
+
+            @param event dict : name, start and duration in seconds, bytes,
+                pid and tid
+        """
+
+        with self._lock:
+            self.events.append(event)
+
+    def summary(self):
+        """ Total wall time, call count and bytes processed for each stage
+
+            @returns dict : {'time', 'calls', 'bytes'} keyed by stage name
+        """
+
+        stages = {}
+
+        for event in self.events:
+            totals = stages.setdefault(
+                event['name'], {'time': 0.0, 'calls': 0, 'bytes': 0})
+            totals['time'] += event['duration']
+            totals['calls'] += 1
+            totals['bytes'] += event['bytes']
+
+        return stages
+
+    def to_json(self, filename):
+        """ Write the summary and all events to a JSON file
+
+            @param filename str : File name
+        """
+
+        with open(filename, 'w') as out_file:
+            json.dump({'summary': self.summary(), 'events': self.events},
+                      out_file, indent=2)
+
+    def to_chrome_trace(self, filename):
+        """ Write the events to a file in the Chrome trace event format, which
+            can be loaded in chrome://tracing or Perfetto
+
+            @param filename str : File name
+        """
+
+        trace = [{'name': event['name'],
+                  'cat': event['name'].split('.')[0],
+                  'ph': 'X',
+                  'ts': event['start'] * 1e6,
+                  'dur': event['duration'] * 1e6,
+                  'pid': event['pid'],
+                  'tid': event['tid'],
+                  'args': {'bytes': event['bytes']}}
+                 for event in self.events]
+
+        with open(filename, 'w') as out_file:
+            json.dump({'traceEvents': trace, 'displayTimeUnit': 'ms'},
+                      out_file)
+
+
+def _update():
+    """ Enable instrumentation if anything is listening for events """
+
+    global ENABLED  # pylint: disable=global-statement
+    ENABLED = bool(_RECORDERS or _CALLBACKS)
+
+
+def _emit(name, start, end, nbytes):
+    """ Send an event to all recorders and callbacks """
+
+    event = {'name': name, 'start': start, 'duration': end - start,
+             'bytes': int(nbytes), 'pid': os.getpid(),
+             'tid': threading.current_thread().ident}
+
+    for recorder in list(_RECORDERS):
+        recorder.add(event)
+
+    for callback in list(_CALLBACKS):
+        callback(event)
+
+
+def add_callback(callback):
+    """ Register a function to be called with each event, as a dict with
+        name, start, duration, bytes, pid and tid keys
+
+        @param callback callable : Function taking one argument
+    """
+
+    _CALLBACKS.append(callback)
+    _update()
+
+
+def remove_callback(callback):
+    """ Unregister a function registered with add_callback
+
+        @param callback callable : Function to unregister
+    """
+
+    _CALLBACKS.remove(callback)
+    _update()
+
+
+@contextmanager
+def recording():
+    """ Record events for the duration of a with block
+
+        @returns Recorder : The recorder for the block
+    """
+
+    recorder = Recorder()
+    _RECORDERS.append(recorder)
+    _update()
+
+    try:
+        yield recorder
+    finally:
+        _RECORDERS.remove(recorder)
+        _update()
+
+
+def _nbytes(values):
+    """ Total size of the numpy arrays in a sequence of values """
+
+    return sum(x.nbytes for x in values if isinstance(x, np.ndarray))
+
+
+def stage(name):
+    """ Decorator which reports the wall time of each call to a function. The
+        bytes processed are the total size of its array arguments or, if there
+        are none, of its array results.
+
+        @param name str : Stage name
+    """
+
+    def decorator(func):
+        """ decorator """
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            """ wrapper """
+
+            if not ENABLED:
+                return func(*args, **kwargs)
+
+            start = _clock()
+            result = func(*args, **kwargs)
+            end = _clock()
+
+            nbytes = _nbytes(args) + _nbytes(kwargs.values())
+            if not nbytes:
+                results = result if isinstance(result, tuple) else (result,)
+                nbytes = _nbytes(results)
+
+            _emit(name, start, end, nbytes)
+
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+class _Span(object):
+    """ Context manager which reports the wall time of a block """
+
+    def __init__(self, name, nbytes):
+        self.name = name
+        self.nbytes = nbytes
+        self.start = None
+
+    def __enter__(self):
+        self.start = _clock()
+        return self
+
+    def __exit__(self, *args):
+        _emit(self.name, self.start, _clock(), self.nbytes)
+
+
+class _NullSpan(object):
+    """ Context manager which does nothing """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(name, nbytes=0):
+    """ Report the wall time of a with block
+
+        @param name str : Stage name
+        @param nbytes int : Number of bytes processed by the block
+    """
+
+    if not ENABLED:
+        return _NULL_SPAN
+
+    return _Span(name, nbytes)
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Copyright 2019 Harvey Ormston
+
+This file is part of osc_gen.
+
+    osc_gen is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    osc_gen is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with osc_gen.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from __future__ import division
+
+import hashlib
+
+import numpy as np
+
+from osc_gen import cache
+from osc_gen import dsp
+
+# band-limited levels, keyed by wave content and octave
+CACHE = cache.LRUCache(maxsize=4096)
+
+
+def num_octaves(wave_len):
+    """ Get the number of mip-map levels for a given wave length. The last
+        level contains only the fundamental.
+
+        @param wave_len int : Number of samples in each wave cycle
+    """
+
+    return max(int(np.log2(wave_len // 2)), 0) + 1
+
+
+def max_harmonic(wave_len, octave):
+    """ Get the highest harmonic kept in a mip-map level. Octave 0 keeps all
+        harmonics up to the Nyquist frequency and each octave above that
+        halves the number of harmonics.
+
+        @param wave_len int : Number of samples in each wave cycle
+        @param octave int : Mip-map level
+    """
+
+    return max((wave_len // 2) >> octave, 1)
+
+
+def _key(wave, octave):
+    """ Build a cache key from the contents of a wave and an octave """
+
+    wave = np.ascontiguousarray(wave)
+    digest = hashlib.sha1(wave.tobytes()).hexdigest()
+
+    return (digest, wave.dtype.str, wave.size, octave)
+
+
+def level(waves, octave, lru=CACHE):
+    """ Get a band-limited copy of wave cycles for playback in a given octave.
+        Cycles which have already been band-limited for the same octave are
+        taken from the cache and the rest are band-limited in one batch.
+
+        @param waves np.ndarray : A (slots, wave_len) array of wave cycles
+        @param octave int : Mip-map level
+        @param lru LRUCache : Cache to use, or None to disable caching
+
+        @returns np.ndarray : A (slots, wave_len) array of band-limited
+            cycles. Cached cycles are read-only.
+    """
+
+    waves = np.atleast_2d(waves)
+    cutoff = max_harmonic(waves.shape[-1], octave)
+
+    if lru is None:
+        return dsp.band_limit(waves, cutoff)
+
+    keys = [_key(wave, octave) for wave in waves]
+    levels = [lru.get(key) for key in keys]
+    missing = [i for i, lev in enumerate(levels) if lev is None]
+
+    if missing:
+        limited = dsp.band_limit(waves[missing], cutoff)
+        limited.setflags(write=False)
+        for i, lev in zip(missing, limited):
+            lru.put(keys[i], lev)
+            levels[i] = lev
+
+    return np.array(levels)
+
+
+def build(waves, octaves=None, lru=CACHE):
+    """ Build a band-limited copy of wave cycles for every octave
+
+        @param waves np.ndarray : A (slots, wave_len) array of wave cycles
+        @param octaves int : Number of octaves, or None for all levels down
+            to the fundamental only
+        @param lru LRUCache : Cache to use, or None to disable caching
+
+        @returns list : A (slots, wave_len) array for each octave
+    """
+
+    waves = np.atleast_2d(waves)
+
+    if octaves is None:
+        octaves = num_octaves(waves.shape[-1])
+
+    return [level(waves, octave, lru) for octave in range(octaves)]
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+Copyright 2019 Harvey Ormston
+
+This file is part of osc_gen.
+
+    osc_gen is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    osc_gen is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with osc_gen.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from __future__ import division
+
+import numpy as np
+
+from osc_gen import cache
+from osc_gen import instrument
+
+# lag ranges and FFT lengths, keyed by frame length and lag limits
+_PLANS = cache.LRUCache(maxsize=16)
+
+# default maximum frame length in samples
+FRAME_LEN = 4096
+
+# default maximum number of frames analysed per signal
+MAX_FRAMES = 256
+
+# default YIN threshold on the cumulative mean normalized difference
+THRESHOLD = 0.1
+
+
+def _plan(frame_len, max_lag):
+    """ Get the FFT length and lags used to analyse frames of a given length
+
+        @param frame_len int : Frame length in samples
+        @param max_lag int : Longest lag in samples
+
+        @returns (int, np.ndarray, np.ndarray) : FFT length, lags and the
+            number of overlapping samples at each lag
+    """
+
+    key = (frame_len, max_lag)
+    plan = _PLANS.get(key)
+
+    if plan is None:
+        # zero padded so that the circular correlation is a linear one
+        fft_len = 1 << int(np.ceil(np.log2(2 * frame_len)))
+        lags = np.arange(max_lag + 1)
+        plan = (fft_len, lags, frame_len - lags)
+        _PLANS.put(key, plan)
+
+    return plan
+
+
+def frames(inp, frame_len, hop):
+    """ Get a read-only view of a signal as overlapping or spaced frames
+
+        @param inp np.ndarray : Signal
+        @param frame_len int : Frame length in samples
+        @param hop int : Number of samples between the starts of frames
+
+        @returns np.ndarray : A (frames, frame_len) view of the signal
+    """
+
+    inp = np.ascontiguousarray(inp)
+    num = (inp.size - frame_len) // hop + 1
+
+    return np.lib.stride_tricks.as_strided(
+        inp, shape=(num, frame_len),
+        strides=(inp.strides[0] * hop, inp.strides[0]), writeable=False)
+
+
+def _difference(frm, max_lag):
+    """ Find the mean squared difference between each frame and itself
+        delayed by each lag, using an FFT autocorrelation
+
+        @param frm np.ndarray : A (frames, frame_len) array
+        @param max_lag int : Longest lag in samples
+    """
+
+    frame_len = frm.shape[-1]
+    fft_len, lags, overlap = _plan(frame_len, max_lag)
+
+    spectrum = np.fft.rfft(frm, fft_len)
+    corr = np.fft.irfft(spectrum * spectrum.conj(), fft_len)
+    corr = corr[:, :max_lag + 1]
+
+    # energy of the overlapping parts of the frame and its delayed copy
+    energy = np.cumsum(frm ** 2, axis=-1)
+    energy = np.concatenate((np.zeros((frm.shape[0], 1)), energy), axis=-1)
+    head = energy[:, overlap]
+    tail = energy[:, -1:] - energy[:, lags]
+
+    diff = np.maximum(head + tail - 2 * corr, 0)
+
+    return diff / overlap
+
+
+def _normalize_difference(diff):
+    """ Find the cumulative mean normalized difference of a YIN difference
+        function, which is 1 at lag 0 and dips towards 0 at the period
+    """
+
+    total = np.cumsum(diff[:, 1:], axis=-1)
+    lags = np.arange(1, diff.shape[-1])
+    out = np.ones_like(diff)
+    np.divide(diff[:, 1:] * lags, total, out=out[:, 1:], where=total > 0)
+
+    return out
+
+
+def _pick_periods(cmnd, diff, min_period, threshold):
+    """ Choose the period of each frame from its normalized difference,
+        refined to a fraction of a sample
+
+        @returns (np.ndarray, np.ndarray) : Periods in samples and the
+            normalized difference at each period
+    """
+
+    num, size = cmnd.shape
+    rows = np.arange(num)
+    lags = np.arange(size)
+
+    # the first dip below the threshold avoids choosing a multiple of the
+    # period, otherwise fall back on the deepest dip
+    search = cmnd.copy()
+    search[:, :min_period] = np.inf
+    search[:, -1] = np.inf
+    minima = np.zeros_like(search, dtype=bool)
+    minima[:, 1:-1] = ((search[:, 1:-1] <= search[:, :-2]) &
+                       (search[:, 1:-1] <= search[:, 2:]))
+    candidates = minima & (search < threshold)
+    voiced = candidates.any(axis=-1)
+    best = np.where(voiced, np.argmax(candidates, axis=-1),
+                    np.argmin(search, axis=-1))
+    best = np.clip(best, 1, size - 2)
+
+    # parabolic interpolation of the mean difference around the dip
+    left = diff[rows, best - 1]
+    centre = diff[rows, best]
+    right = diff[rows, best + 1]
+    curve = left - 2 * centre + right
+    shift = np.zeros(num)
+    np.divide(left - right, 2 * curve, out=shift, where=curve > 0)
+    periods = lags[best] + np.clip(shift, -0.5, 0.5)
+
+    return periods, cmnd[rows, best]
+
+
+def _analyse(inp, fs, fmin, fmax, frame_len, max_frames, threshold):
+    """ Estimate the period of evenly spaced frames of a signal
+
+        @returns (np.ndarray, np.ndarray, np.ndarray) : The centre of each
+            frame in seconds, the frequency of each frame in Hz and the
+            normalized difference at each period
+    """
+
+    inp = np.asarray(inp, dtype=np.float64)
+    frame_len = min(frame_len, inp.size)
+    max_period = frame_len // 2
+    min_period = 2
+
+    if fmin is not None:
+        max_period = min(max_period, int(np.ceil(fs / fmin)))
+    if fmax is not None:
+        min_period = max(min_period, int(np.floor(fs / fmax)))
+
+    if max_period <= min_period:
+        raise ValueError("Signal is too short to detect pitch.")
+
+    hop = max(frame_len // 4, 1)
+    if max_frames > 1:
+        hop = max(hop, int(np.ceil((inp.size - frame_len) / (max_frames - 1))))
+
+    frm = frames(inp, frame_len, hop)
+
+    with instrument.span('pitch.yin', frm.nbytes):
+        # one extra lag so that a dip at the longest period can be refined
+        diff = _difference(frm, max_period + 1)
+        cmnd = _normalize_difference(diff)
+        periods, aperiodicity = _pick_periods(cmnd, diff, min_period,
+                                              threshold)
+
+    times = (np.arange(frm.shape[0]) * hop + frame_len / 2) / fs
+
+    return times, fs / periods, aperiodicity
+
+
+@instrument.stage('pitch.track')
+def track(inp, fs, fmin=None, fmax=None, frame_len=FRAME_LEN,
+          max_frames=MAX_FRAMES, threshold=THRESHOLD):
+    """ Track the fundamental frequency of a signal over time using the YIN
+        method. Long signals are analysed from evenly spaced frames rather
+        than every sample, so the cost is bounded by max_frames.
+
+        @param inp np.ndarray : Signal
+        @param fs number : Sample rate in Hz
+        @param fmin number : Lowest frequency to detect in Hz. Defaults to
+            the lowest frequency for which two periods fit in a frame.
+        @param fmax number : Highest frequency to detect in Hz. Defaults to
+            half of the sample rate.
+        @param frame_len int : Maximum frame length in samples (default 4096)
+        @param max_frames int : Maximum number of frames (default 256)
+        @param threshold float : Normalized difference below which a frame is
+            considered to be periodic (default 0.1)
+
+        @returns (np.ndarray, np.ndarray) : The centre of each frame in
+            seconds and the frequency of each frame in Hz, which is NaN for
+            frames which are not periodic.
+    """
+
+    times, freqs, aperiodicity = _analyse(inp, fs, fmin, fmax, frame_len,
+                                          max_frames, threshold)
+    freqs[aperiodicity >= threshold] = np.nan
+
+    return times, freqs
+
+
+@instrument.stage('pitch.detect')
+def detect(inp, fs, fmin=None, fmax=None, frame_len=FRAME_LEN,
+           max_frames=MAX_FRAMES, threshold=THRESHOLD):
+    """ Find the fundamental frequency of a signal along with its pitch
+        track. See track for a description of the parameters.
+
+        @param inp np.ndarray : Signal
+        @param fs number : Sample rate in Hz
+
+        @returns (float, np.ndarray, np.ndarray) : The median frequency of
+            the periodic frames in Hz, followed by the times and frequencies
+            from track. Where no frame is periodic, the frequency of the most
+            periodic frame is used instead.
+    """
+
+    times, freqs, aperiodicity = _analyse(inp, fs, fmin, fmax, frame_len,
+                                          max_frames, threshold)
+    voiced = aperiodicity < threshold
+
+    if voiced.any():
+        f0 = np.median(freqs[voiced])
+    else:
+        f0 = freqs[np.argmin(aperiodicity)]
+
+    freqs[~voiced] = np.nan
+
+    return f0, times, freqs
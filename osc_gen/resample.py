@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Copyright 2019 Harvey Ormston
+
+This file is part of osc_gen.
+
+    osc_gen is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    osc_gen is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with osc_gen.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from __future__ import division
+
+import numpy as np
+
+from osc_gen import cache
+from osc_gen import config
+
+# interpolation plans, keyed by method, source and destination lengths
+PLANS = cache.LRUCache(maxsize=64)
+
+
+def _result_dtype(data):
+    """ Get the dtype of resampled data: the dtype of the input if it is
+        floating point, otherwise config.DTYPE """
+
+    if np.issubdtype(data.dtype, np.floating):
+        return data.dtype
+
+    return config.get_dtype()
+
+
+def _linear_plan(src_len, dst_len):
+    """ Get the sample indices and interpolation factors used to linearly
+        resample cycles of one length to another. The first and last output
+        samples are the first and last input samples, as with SigGen.arb.
+
+        @param src_len int : Number of samples in each input cycle
+        @param dst_len int : Number of samples in each output cycle
+
+        @returns (np.ndarray, np.ndarray) : Index of the input sample before
+            each output sample, and the distance past it, between 0 and 1.
+            Both are read-only.
+    """
+
+    key = ('linear', src_len, dst_len)
+    plan = PLANS.get(key)
+
+    if plan is None:
+        src_x = np.linspace(0, src_len, num=src_len)
+        dst_x = np.linspace(0, src_len, num=dst_len)
+
+        idx = np.searchsorted(src_x, dst_x, side='right') - 1
+        idx = np.clip(idx, 0, max(src_len - 2, 0))
+
+        if src_len > 1:
+            frac = (dst_x - src_x[idx]) / (src_x[idx + 1] - src_x[idx])
+        else:
+            frac = np.zeros(dst_len)
+
+        idx.setflags(write=False)
+        frac.setflags(write=False)
+        plan = (idx, frac)
+        PLANS.put(key, plan)
+
+    return plan
+
+
+def _fft_plan(src_len, dst_len):
+    """ Get the spectrum bins kept, and their gains, when resampling
+        periodic cycles of one length to another in the frequency domain
+
+        @param src_len int : Number of samples in each input cycle
+        @param dst_len int : Number of samples in each output cycle
+
+        @returns (int, np.ndarray) : Number of bins kept, and a read-only
+            gain for each of them
+    """
+
+    key = ('fft', src_len, dst_len)
+    plan = PLANS.get(key)
+
+    if plan is None:
+        num_bins = min(src_len, dst_len) // 2 + 1
+        gain = np.full(num_bins, dst_len / src_len)
+
+        if num_bins - 1 == dst_len / 2 and src_len > dst_len:
+            # a harmonic at the output Nyquist frequency is held in a
+            # single bin, rather than being split between positive and
+            # negative frequencies
+            gain[-1] *= 2
+        elif num_bins - 1 == src_len / 2 and dst_len > src_len:
+            gain[-1] /= 2
+
+        gain.setflags(write=False)
+        plan = (num_bins, gain)
+        PLANS.put(key, plan)
+
+    return plan
+
+
+def linear(data, num_points, out=None):
+    """ Resample wave cycles by linear interpolation
+
+        @param data np.ndarray : A single wave cycle, or a 2D array of cycles
+        @param num_points int : Number of samples in each output cycle
+        @param out np.ndarray : Array to write the result to. Defaults to a
+            new array.
+
+        @returns np.ndarray : Resampled cycles
+    """
+
+    data = np.asarray(data)
+    dtype = _result_dtype(data)
+    idx, frac = _linear_plan(data.shape[-1], num_points)
+    frac = frac.astype(dtype, copy=False)
+
+    if out is None:
+        out = np.empty(data.shape[:-1] + (num_points,), dtype=dtype)
+
+    before = np.take(data, idx, axis=-1)
+    after = np.take(data, np.minimum(idx + 1, data.shape[-1] - 1), axis=-1)
+
+    # before + (after - before) * frac
+    np.subtract(after, before, out=after)
+    after *= frac
+    np.add(before, after, out=out)
+
+    return out
+
+
+def fft(data, num_points, out=None):
+    """ Resample periodic wave cycles in the frequency domain. Harmonics
+        below the Nyquist frequency of both lengths are kept exactly and
+        those above it are removed, so the result is band-limited.
+
+        @param data np.ndarray : A single wave cycle, or a 2D array of cycles
+        @param num_points int : Number of samples in each output cycle
+        @param out np.ndarray : Array to write the result to. Defaults to a
+            new array.
+
+        @returns np.ndarray : Resampled cycles
+    """
+
+    data = np.asarray(data)
+    dtype = _result_dtype(data)
+    num_bins, gain = _fft_plan(data.shape[-1], num_points)
+
+    spectrum = np.fft.rfft(data, axis=-1)
+    resized = np.zeros(data.shape[:-1] + (num_points // 2 + 1,),
+                       dtype=spectrum.dtype)
+    np.multiply(spectrum[..., :num_bins], gain, out=resized[..., :num_bins])
+    resampled = np.fft.irfft(resized, n=num_points, axis=-1)
+
+    if out is None:
+        return resampled.astype(dtype, copy=False)
+
+    np.copyto(out, resampled)
+
+    return out
+
+
+METHODS = {
+    'linear': linear,
+    'fft': fft,
+}
+
+
+def resample(data, num_points, method='linear', out=None):
+    """ Resample wave cycles to a given number of samples. Interpolation
+        plans are computed once for each pair of lengths and cached, and all
+        cycles in a 2D array are resampled in one pass.
+
+        @param data np.ndarray : A single wave cycle, or a 2D array of cycles
+            of the same length
+        @param num_points int : Number of samples in each output cycle
+        @param method str : 'linear' for linear interpolation, or 'fft' for
+            band-limited resampling of periodic cycles
+        @param out np.ndarray : Array to write the result to. Defaults to a
+            new array.
+
+        @returns np.ndarray : Resampled cycles
+    """
+
+    try:
+        func = METHODS[method]
+    except KeyError:
+        raise ValueError("Unknown resampling method {0}, expected one of "
+                         "{1}".format(method, sorted(METHODS)))
+
+    return func(data, num_points, out=out)
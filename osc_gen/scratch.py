@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Copyright 2019 Harvey Ormston
+
+This file is part of osc_gen.
+
+    osc_gen is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    osc_gen is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with osc_gen.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from collections import OrderedDict
+from contextlib import contextmanager
+import threading
+
+import numpy as np
+
+from osc_gen import config
+
+
+class BufferPool(object):
+    """ A size-bounded pool of arrays for temporary results, so that loops
+    which repeatedly need arrays of the same shape allocate them only once.
+    Arrays taken from the pool are uninitialized. """
+
+    def __init__(self, maxsize=32, max_bytes=1 << 26):
+        """
+        Init
+
+        @param maxsize int : Maximum number of free arrays to hold
+        @param max_bytes int : Maximum total size in bytes of the free arrays
+            to hold (default 64 MiB). Arrays larger than this are never
+            pooled.
+        """
+
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self.allocations = 0
+        self.reuses = 0
+        self._free = OrderedDict()
+        self._size = 0
+        self._nbytes = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._size
+
+    def get(self, shape, dtype=None):
+        """ Take an array from the pool, or allocate one if there is no free
+            array of the requested shape and dtype. Return it with put() when
+            it is no longer needed.
+
+            @param shape int or tuple : Array shape
+            @param dtype : Array dtype. Defaults to config.DTYPE.
+        """
+
+        shape = tuple(int(x) for x in np.atleast_1d(shape))
+        dtype = np.dtype(config.get_dtype() if dtype is None else dtype)
+        key = (shape, dtype.str)
+
+        with self._lock:
+            free = self._free.get(key)
+            if free:
+                self.reuses += 1
+                self._size -= 1
+                buf = free.pop()
+                self._nbytes -= buf.nbytes
+                if not free:
+                    del self._free[key]
+                return buf
+            self.allocations += 1
+
+        return np.empty(shape, dtype=dtype)
+
+    def put(self, *arrays):
+        """ Return arrays to the pool, discarding the least recently returned
+            arrays if the pool is full
+
+            @param arrays np.ndarray : Arrays which are no longer in use
+        """
+
+        with self._lock:
+            for arr in arrays:
+                if arr.nbytes > self.max_bytes:
+                    continue
+                key = (arr.shape, arr.dtype.str)
+                free = self._free.pop(key, [])
+                free.append(arr)
+                self._free[key] = free
+                self._size += 1
+                self._nbytes += arr.nbytes
+
+            while self._size > self.maxsize or self._nbytes > self.max_bytes:
+                key, free = next(iter(self._free.items()))
+                self._nbytes -= free.pop(0).nbytes
+                self._size -= 1
+                if not free:
+                    del self._free[key]
+
+    @contextmanager
+    def borrow(self, shape, dtype=None):
+        """ Take an array from the pool for the duration of a block
+
+            @param shape int or tuple : Array shape
+            @param dtype : Array dtype. Defaults to config.DTYPE.
+        """
+
+        buf = self.get(shape, dtype)
+
+        try:
+            yield buf
+        finally:
+            self.put(buf)
+
+    def clear(self):
+        """ Discard all free arrays and reset the counters """
+
+        with self._lock:
+            self._free.clear()
+            self._size = 0
+            self._nbytes = 0
+            self.allocations = 0
+            self.reuses = 0
+
+    def info(self):
+        """ Get pool statistics
+
+            @returns dict : allocations, reuses, size, maxsize, nbytes and
+                max_bytes
+        """
+
+        return {'allocations': self.allocations, 'reuses': self.reuses,
+                'size': self._size, 'maxsize': self.maxsize,
+                'nbytes': self._nbytes, 'max_bytes': self.max_bytes}
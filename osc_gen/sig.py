@@ -20,44 +20,122 @@ This file is part of osc_gen.
 
 import numpy as np
 
+from osc_gen import cache
+from osc_gen import config
 from osc_gen import dsp
+from osc_gen import instrument
+from osc_gen import resample
+
+# single precision base waveform cycles, keyed by (num_points, harmonic, phase)
+RAMP_CACHE = cache.LRUCache(maxsize=64)
+
+
+def _ramp(num_points, harmonic, phase, dtype=np.float32):
+    """ Generate a sawtooth or ramp from -1 to 1
+
+        @param num_points int : Number of samples
+        @param harmonic int or np.ndarray : Harmonic, where 0 is one cycle
+        @param phase float or np.ndarray : Starting phase in radians
+        @param dtype : Floating point dtype of the result
+
+        If harmonic or phase are arrays, one ramp is generated per value, in
+        the rows of a 2D array.
+    """
+
+    repeats = np.add(harmonic, 1)
+    normalized_phase = np.divide(phase, 2 * np.pi)
+    start = normalized_phase
+    stop = start + repeats
+
+    # the ramp is always generated in single precision, so that waves are
+    # the same whatever the dtype
+    start, stop = np.broadcast_arrays(start, stop)
+    wave = np.linspace(start, stop, num=num_points, dtype=np.float32, axis=-1)
+
+    # wrap and shift to +/- 1
+    wrap_threshold = np.finfo(np.float32).eps
+    wave %= 1 + wrap_threshold
+    wave *= 2
+    wave[wave > 1] -= 2
+
+    return wave.astype(dtype, copy=False)
+
+
+def _stretch(data, num_points, dtype=None):
+    """ Linearly interpolate and normalize each row of a 2D array to occupy a
+        given number of samples, in the same way as SigGen.arb
+
+        @param data np.ndarray : A 2D array of wave cycles
+        @param num_points int : Number of samples in each output cycle
+        @param dtype : If given, the cycles are interpolated at the higher
+            precision of this and the data's dtype, and returned in this dtype
+    """
+
+    if dtype is not None:
+        data = data.astype(np.result_type(data.dtype, dtype), copy=False)
+
+    if data.shape[-1] != num_points:
+        data = dsp.normalize(resample.linear(data, num_points))
+
+    return data if dtype is None else data.astype(dtype, copy=False)
 
 
 class SigGen(object):
     """ Signal Generator """
 
-    def __init__(self, num_points=128, amp=1.0, phase=0, harmonic=0):
-        """ Init """
+    def __init__(self, num_points=128, amp=1.0, phase=0, harmonic=0,
+                 dtype=None, method='linear'):
+        """ Init
+
+            @param dtype : Floating point dtype of generated cycles, or None
+                to follow config.DTYPE
+            @param method str : Resampling method used by arb, 'linear' or
+                'fft'. See resample.resample.
+        """
 
         self.num_points = num_points
         self.amp = amp
         self.harmonic = harmonic
         self.phase = phase
+        self.dtype = dtype
+        self.method = method
+
+    @property
+    def _dtype(self):
+        """ The dtype of generated cycles """
+
+        return config.get_dtype(self.dtype)
+
+    @property
+    def _cycle_dtype(self):
+        """ The dtype of cycles generated directly from the base cycle, which
+        are single precision unless a dtype is set """
+
+        return config.get_dtype(self.dtype, default=np.float32)
 
     @property
     def _base(self):
-        """ Generate the base waveform cycle, a sawtooth or ramp from -1 to 1
+        """ Generate the base waveform cycle, a sawtooth or ramp from -1 to 1.
+        Cycles are cached, so the result is read-only. The base cycle is
+        single precision whatever the dtype, and waves derived from it are
+        converted to the dtype when they are returned, so that they have the
+        same values for every dtype.
         """
 
-        repeats = self.harmonic + 1
-        normalized_phase = self.phase / (2 * np.pi)
-        start = normalized_phase
-        stop = start + repeats
+        key = (self.num_points, self.harmonic, self.phase)
+        wave = RAMP_CACHE.get(key)
 
-        wave = np.linspace(start, stop, num=self.num_points, dtype=np.float32)
+        if wave is None:
+            wave = _ramp(*key)
+            wave.setflags(write=False)
+            RAMP_CACHE.put(key, wave)
 
-        # wrap and shift to +/- 1
-        wrap_threshold = np.finfo(np.float32).eps
-        wave %= 1 + wrap_threshold
-        wave *= 2
-        wave[wave > 1] -= 2
-
-        return wave
+        return wave.view()
 
     def saw(self):
         """ Generate a sawtooth wave cycle """
 
-        return self.amp * self._base
+        return (self.amp * self._base).astype(self._cycle_dtype, copy=False)
 
     def tri(self):
         """ Generate a triangle wave cycle """
@@ -74,11 +152,11 @@ class SigGen(object):
                 where 0 corresponds to a square wave.
         """
 
-        pls = self._base
-        pls[np.where(pls < width)[0]] = -1.
-        pls[np.where(pls >= width)[0]] = 1.
+        base = self._base
+        pls = np.ones_like(base)
+        pls[base < width] = -1.
 
-        return self.amp * pls
+        return (self.amp * pls).astype(self._cycle_dtype, copy=False)
 
     def sqr(self):
         """ Generate a square wave cycle """
@@ -104,22 +182,28 @@ class SigGen(object):
             @param amount int : amount of exponential distortion
         """
 
+        return self._exp_saw(amount).astype(self._cycle_dtype, copy=False)
+
+    def _exp_saw(self, amount):
+        """ Exponential saw wave, derived from the base cycle in single
+            precision """
+
         exp = 3 + (2 * int(amount))
-        return dsp.normalize(np.power(self.saw(), exp))
+        return dsp.normalize(np.power(self.amp * self._base, exp))
 
     def exp_sin(self, amount=0):
         """ Exponential sine wave
             @param amount int : amount of exponential distortion
         """
 
-        return self.amp * self.arb(np.sin(np.pi * self.exp_saw(amount)[:-1]))
+        return self.amp * self.arb(np.sin(np.pi * self._exp_saw(amount)[:-1]))
 
     def sqr_saw(self, mix=0.5):
         """ Square plus Saw wave """
 
         return dsp.mix(self.sqr(), self.saw(), amount=mix)
 
-    def noise(self, seed=None, character=0.5):
+    def noise(self, seed=None, character=0.5, num=None):
         """ Noise waveform
             @param seed int : Random seed
             @param character float : Noise filtering, between 0 and 1.
@@ -133,11 +217,18 @@ class SigGen(object):
                 values giving a high cutoff frequency.
 
                 A character value of 0.5 performs no filtering.
+            @param num int : If given, a 2D array of num independent noise
+                cycles is generated and filtered in one pass.
         """
 
         np.random.seed(seed)
 
-        noise = np.random.uniform(-1, 1, self.num_points)
+        if num is None:
+            shape = self.num_points
+        else:
+            shape = (num, self.num_points)
+
+        noise = np.random.uniform(-1, 1, shape).astype(self._dtype)
 
         character = np.clip(character, 0, 1)
 
@@ -145,29 +236,165 @@ class SigGen(object):
             # low-pass
             beta = character * 2
             alpha = 1 - beta
-            noise = np.tile(noise, 2)
-            for idx, val in enumerate(noise):
-                if idx == 0:
-                    noise[idx] = 0
-                else:
-                    noise[idx] = (val * beta) + (noise[idx - 1] * alpha)
-            noise = noise[self.num_points:]
+            noise = np.concatenate((noise, noise), axis=-1)
+            # the first output sample is zero, so filtering starts from the
+            # second input sample
+            noise = dsp.one_pole(noise[..., 1:], beta, alpha)
+            noise = noise[..., self.num_points - 1:]
 
         elif character > 0.5:
             # high-pass
             alpha = (character - 0.5) * 2
             beta = 1 - alpha
-            noise = np.tile(noise, 2)
-            dc_lev = np.empty_like(noise)
-            dc_lev[0] = noise[0] * alpha
-            for idp, val in enumerate(noise[1:]):
-                idx = idp + 1
-                dc_lev[idx] = (dc_lev[idx - 1] * beta) + (val * alpha)
-                noise[idx] -= dc_lev[idx]
-            noise = noise[self.num_points:]
+            noise = np.concatenate((noise, noise), axis=-1)
+            dc_lev = dsp.one_pole(noise, alpha, beta)
+            noise -= dc_lev
+            noise = noise[..., self.num_points:]
 
         return dsp.normalize(noise)
 
+    def _batch_params(self, harmonic, phase, amp, *params):
+        """ Broadcast batch parameters against each other, using this SigGen's
+            settings for any which are None.
+
+            @returns list : A 1D array for each parameter
+        """
+
+        if harmonic is None:
+            harmonic = self.harmonic
+        if phase is None:
+            phase = self.phase
+        if amp is None:
+            amp = self.amp
+
+        params = [np.atleast_1d(x) for x in
+                  np.broadcast_arrays(harmonic, phase, amp, *params)]
+        params[2] = params[2].astype(self._dtype)
+
+        return params
+
+    def saw_batch(self, harmonic=None, phase=None, amp=None):
+        """ Generate a batch of sawtooth wave cycles, one for each value of
+            the parameters, which are broadcast against each other. Parameters
+            which are None take the value of this SigGen's settings.
+
+            @param harmonic np.ndarray : Harmonics
+            @param phase np.ndarray : Phases in radians
+            @param amp np.ndarray : Amplitudes
+
+            @returns np.ndarray : A (len(params), num_points) array
+        """
+
+        harmonic, phase, amp = self._batch_params(harmonic, phase, amp)
+        base = _ramp(self.num_points, harmonic, phase)
+
+        # single precision, as by saw
+        saw = amp[:, np.newaxis].astype(base.dtype) * base
+
+        return saw.astype(self._cycle_dtype, copy=False)
+
+    def tri_batch(self, harmonic=None, phase=None, amp=None):
+        """ Generate a batch of triangle wave cycles. See saw_batch.
+
+            @returns np.ndarray : A (len(params), num_points) array
+        """
+
+        harmonic, phase, amp = self._batch_params(harmonic, phase, amp)
+
+        base = _ramp(self.num_points, harmonic, phase)
+        tri = amp[:, np.newaxis] * _stretch(np.abs(base[:, :-1]),
+                                            self.num_points, self._dtype)
+
+        # shift each cycle to start at 0
+        shift = -self.num_points // (4 * (harmonic + 1))
+        idx = np.arange(self.num_points) - shift[:, np.newaxis]
+        idx %= self.num_points
+
+        return np.take_along_axis(tri, idx, axis=-1)
+
+    def pls_batch(self, width, harmonic=None, phase=None, amp=None):
+        """ Generate a batch of pulse wave cycles. See saw_batch.
+
+            @param width np.ndarray : Pulse widths, between -1 and 1
+
+            @returns np.ndarray : A (len(params), num_points) array
+        """
+
+        harmonic, phase, amp, width = self._batch_params(
+            harmonic, phase, amp, width)
+
+        base = _ramp(self.num_points, harmonic, phase)
+        pls = np.ones_like(base)
+        pls[base < width[:, np.newaxis]] = -1.
+        pls *= amp[:, np.newaxis]
+
+        return pls.astype(self._cycle_dtype, copy=False)
+
+    def sqr_batch(self, harmonic=None, phase=None, amp=None):
+        """ Generate a batch of square wave cycles. See saw_batch.
+
+            @returns np.ndarray : A (len(params), num_points) array
+        """
+
+        return self.pls_batch(0, harmonic, phase, amp)
+
+    def sin_batch(self, harmonic=None, phase=None, amp=None):
+        """ Generate a batch of sine wave cycles. See saw_batch.
+
+            @returns np.ndarray : A (len(params), num_points) array
+        """
+
+        harmonic, phase, amp = self._batch_params(harmonic, phase, amp)
+
+        base = _ramp(self.num_points, harmonic, phase)
+        sin = _stretch(np.sin(np.pi * base[:, :-1]), self.num_points,
+                       self._dtype)
+
+        return amp[:, np.newaxis] * sin
+
+    def exp_saw_batch(self, amount, harmonic=None, phase=None, amp=None):
+        """ Generate a batch of exponential saw wave cycles. See saw_batch.
+
+            @param amount np.ndarray : Amounts of exponential distortion
+
+            @returns np.ndarray : A (len(params), num_points) array
+        """
+
+        exp_saw = self._exp_saw_batch(amount, harmonic, phase, amp)
+
+        return exp_saw.astype(self._cycle_dtype, copy=False)
+
+    def _exp_saw_batch(self, amount, harmonic, phase, amp):
+        """ Generate a batch of exponential saw wave cycles in single
+            precision, as by _exp_saw """
+
+        harmonic, phase, amp, amount = self._batch_params(
+            harmonic, phase, amp, amount)
+
+        base = _ramp(self.num_points, harmonic, phase)
+        saw = amp[:, np.newaxis].astype(base.dtype) * base
+        exp = 3 + (2 * amount.astype(int))
+
+        return dsp.normalize(np.power(saw, exp[:, np.newaxis].astype(saw.dtype)))
+
+    def exp_sin_batch(self, amount, harmonic=None, phase=None, amp=None):
+        """ Generate a batch of exponential sine wave cycles. See saw_batch.
+
+            @param amount np.ndarray : Amounts of exponential distortion
+
+            @returns np.ndarray : A (len(params), num_points) array
+        """
+
+        harmonic, phase, amp, amount = self._batch_params(
+            harmonic, phase, amp, amount)
+
+        exp_saw = self._exp_saw_batch(amount, harmonic, phase, amp)
+        exp_sin = _stretch(np.sin(np.pi * exp_saw[:, :-1]), self.num_points,
+                           self._dtype)
+
+        return amp[:, np.newaxis] * exp_sin
+
+    @instrument.stage('SigGen.arb')
     def arb(self, data):
         """ Generate an arbitrary wave cycle. The provided data will be
         interpolated, if possible, to occupy the correct number of samples for
@@ -178,27 +405,63 @@ class SigGen(object):
             of a wave
         """
 
+        dtype = self._dtype
+
         try:
-            dtype = type(data)
             if not isinstance(data, np.ndarray):
-                data = np.array(list(data)).astype(np.float32)
+                data = np.array(list(data)).astype(dtype)
         except ValueError:
-            raise ValueError("Expected a sequence of data, got type {}.".format(dtype))
+            raise ValueError("Expected a sequence of data, got type {}.".format(type(data)))
 
         if data.size == self.num_points:
-            return data
+            return data.astype(dtype, copy=False)
+
+        return self._resample(data.ravel())
+
+    @instrument.stage('SigGen.arb_batch')
+    def arb_batch(self, data):
+        """ Generate a batch of arbitrary wave cycles, as by arb. Cycles of
+        the same length are resampled and normalized together, in one pass.
+
+        @param data seq : A 2D array with a wave cycle in each row, or a
+            sequence of wave cycles, which may differ in length
+
+        @returns np.ndarray : A (len(data), num_points) array
+        """
 
-        interp_y = data
-        num = interp_y.size
-        interp_x = np.linspace(0, num, num=num)
-        interp_xx = np.linspace(0, num, num=self.num_points)
-        interp_yy = np.interp(interp_xx, interp_x, interp_y)
-        dsp.normalize(interp_yy)
+        if isinstance(data, np.ndarray) and data.ndim == 2:
+            if data.shape[-1] == self.num_points:
+                return data.astype(self._dtype, copy=False)
+            return self._resample(data)
 
-        return interp_yy
+        cycles = [np.asarray(x) for x in data]
+        waves = np.empty((len(cycles), self.num_points), dtype=self._dtype)
 
+        for length in set(x.size for x in cycles):
+            idx = [i for i, x in enumerate(cycles) if x.size == length]
+            group = np.array([cycles[i].ravel() for i in idx])
+            if length == self.num_points:
+                waves[idx] = group
+            else:
+                waves[idx] = self._resample(group)
+
+        return waves
+
+    def _resample(self, data):
+        """ Resample and normalize wave cycles to num_points samples """
+
+        dtype = self._dtype
+        # resampled at the higher of the two precisions
+        data = data.astype(np.result_type(data.dtype, dtype), copy=False)
+        resampled = np.empty(data.shape[:-1] + (self.num_points,), dtype=dtype)
+        resample.resample(data, self.num_points, self.method, out=resampled)
+        dsp.normalize(resampled)
 
-def morph(waves, new_num):
+        return resampled
+
+
+@instrument.stage('sig.morph')
+def morph(waves, new_num, out=None, dtype=None):
     """ Take a number of wave cycles and generate a higher number of wave cycles
         where the original waves are linearly interpolated from one to the next
         to fill in the gaps.
@@ -206,9 +469,15 @@ def morph(waves, new_num):
         @param waves sequence : A sequence of wave cycles
         @param new_num int : The reuqired number of wave cycles in the new
             seuqence
+        @param out np.ndarray : Optional (new_num, wave_len) array, e.g. a
+            wavetable buffer, to write the morphed wave cycles into.
+        @param dtype : Floating point dtype of the result, if out is not
+            given. Defaults to config.DTYPE.
+
+        @returns np.ndarray : A (new_num, wave_len) array of wave cycles
     """
 
-    inp = list(waves)
+    inp = np.asarray(waves if isinstance(waves, np.ndarray) else list(waves))
     inp_num = len(inp)
 
     if inp_num >= new_num:
@@ -220,11 +489,24 @@ def morph(waves, new_num):
         raise ValueError(msg.format(inp_num))
 
     if inp_num == 2:
-        return _morph_two(inp[0], inp[1], new_num)
+        ranges = [new_num]
+    else:
+        ranges = _detrmine_morph_ranges(inp_num, new_num)
 
-    ranges = _detrmine_morph_ranges(inp_num, new_num)
+    segments, alphas = _morph_plan(ranges)
 
-    return _morph_many(inp, ranges)
+    dtype = out.dtype if out is not None else config.get_dtype(dtype)
+    alphas = alphas[:, np.newaxis]
+
+    if out is None:
+        out = np.empty((new_num, inp.shape[-1]), dtype=dtype)
+    elif np.may_share_memory(inp, out):
+        inp = inp.copy()
+
+    np.multiply(inp[segments], (1 - alphas).astype(dtype), out=out)
+    out += inp[segments + 1] * alphas.astype(dtype)
+
+    return out
 
 
 def _detrmine_morph_ranges(inp_num, new_num):
@@ -248,41 +530,24 @@ def _detrmine_morph_ranges(inp_num, new_num):
     return ranges
 
 
-def _morph_many(waves, gaps):
-    """ Morph between more then two sequences
+def _morph_plan(gaps):
+    """ Find, for each morphed wave cycle, the index of the first of the pair
+        of original wave cycles it lies between and the interpolation factor
+        between them. Adjacent pairs share an end point, so it is only
+        included once.
 
-        @param waves sequence : A sequence of wave cycles
         @param gaps sequence : The size of the gap between each pair of cycles
-    """
-
-    morphed = []
-    prev_wave = None
-    i = 0
-    for curr_wave in waves:
-        if prev_wave is not None:
-            if i:
-                start = 1
-            else:
-                start = 0
 
-            morphed.extend(
-                [x for x in _morph_two(
-                    prev_wave, curr_wave, gaps[i])][start:])
-            i += 1
-
-        prev_wave = curr_wave
-
-    return morphed
-
-
-def _morph_two(wave_one, wave_two, new_num):
-    """ Morph between two wave cycles.
-
-        @param a sequence : The first wave cycle
-        @param b sequence : The second wave cycle
-        @param n int : The reuqired number of wave cycles in the new seuqence
+        @returns tuple : (segment indices, interpolation factors)
     """
 
-    alphas = (s / (new_num - 1.0) for s in range(new_num))
+    gaps = np.asarray(gaps)
+    counts = gaps - 1
+    counts[0] += 1
+
+    segments = np.repeat(np.arange(gaps.size), counts)
+    firsts = np.cumsum(counts) - counts
+    steps = np.arange(segments.size) - firsts[segments] + (segments > 0)
+    alphas = steps / (gaps[segments] - 1.0)
 
-    return [wave_one * (1 - m) + wave_two * m for m in alphas]
+    return segments, alphas
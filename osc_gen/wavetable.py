@@ -23,26 +23,62 @@ from __future__ import print_function
 import numpy as np
 
 from osc_gen import wavfile
+from osc_gen import cache
+from osc_gen import chain
+from osc_gen import config
 from osc_gen import dsp
+from osc_gen import export
+from osc_gen import instrument
+from osc_gen import mipmap
 from osc_gen import sig
+from osc_gen import wtfile
 from osc_gen import zosc
 
 
+def _waves_dtype(waves):
+    """ Get the dtype which holds a sequence of floating point arrays, or
+    float64 if they are not all floating point arrays """
+
+    dtypes = [getattr(wave, 'dtype', None) for wave in
+              (waves if waves is not None else [])]
+
+    if dtypes and all(x is not None and x.kind == 'f' for x in dtypes):
+        return np.result_type(*dtypes)
+
+    return np.float64
+
+
 class WaveTable(object):
     """ An n-slot wavetable """
 
-    def __init__(self, num_slots, waves=None, wave_len=None):
+    def __init__(self, num_slots, waves=None, wave_len=None, contiguous=False,
+                 dtype=None, method='linear'):
         """
         Init
 
+        @param num_slots int : Number of slots in the wavetable
         @param waves sequence : A sequence of numpy arrays containing wave
             data to form the wavetable
+        @param wave_len int : Number of samples in each wave
+        @param contiguous bool : If True, the waves are stored in a single
+            preallocated (num_slots, wave_len) array and slots are returned as
+            views into it, rather than as copies (default False).
+        @param dtype : Floating point dtype of the waves. Defaults to
+            config.DTYPE if it is set, otherwise the dtype of the given waves
+            if they are floating point arrays, otherwise float64.
+        @param method str : Resampling method used for waves which are not
+            wave_len samples long, 'linear' or 'fft'. See resample.resample.
         """
 
         self.num_slots = num_slots
         self.wave_len = wave_len
+        self.contiguous = contiguous
+        self.dtype = config.get_dtype(dtype, _waves_dtype(waves))
+        self.method = method
 
         self._waves = []
+        self._buffer = None
+        self._num_waves = 0
 
         if waves is not None:
             self.waves = waves
@@ -50,25 +86,173 @@ class WaveTable(object):
     @property
     def waves(self):
         """ wavetable waves """
+
+        if self.contiguous:
+            if self._buffer is None:
+                return []
+            return self._buffer[:self._num_waves]
+
         return self._waves
 
     @waves.setter
     def waves(self, value):
 
-        if hasattr(value, '__iter__') and value:
+        if hasattr(value, '__iter__') and len(value):
 
-            if self.wave_len is None:
+            if self.contiguous:
+                self._fill_buffer(value)
+            elif self.wave_len is None:
                 self.wave_len = len(value[0])
                 self._waves = value
             else:
-                self._waves = [sig.SigGen(num_points=self.wave_len).arb(x) for x in value]
+                self._waves = list(self._sig_gen().arb_batch(value))
 
         else:
             raise ValueError("Waves must be a sequence with length > 0")
 
+    @classmethod
+    def from_array(cls, waves):
+        """ Create a contiguous wavetable which uses an array as its wave
+        buffer without copying it, e.g. a memory-mapped array. The number of
+        slots, wave length and dtype are taken from the array. If the array
+        is read-only, the table still can be modified: the buffer is copied
+        the first time it is written to.
+
+        @param waves np.ndarray : A (num_slots, wave_len) array
+
+        @returns WaveTable : Wavetable
+        """
+
+        table = cls(waves.shape[0], wave_len=waves.shape[1], contiguous=True,
+                    dtype=waves.dtype)
+        table._adopt(waves)
+
+        return table
+
+    @classmethod
+    def from_cache(cls, disk_cache, recipe, build):
+        """ Get a wavetable from a disk cache, building and storing it if it
+        isn't found, e.g.
+
+            recipe = {'saw': {'num_points': 2048}, 'fold': [0.5, 1.0]}
+            table = WaveTable.from_cache(disk_cache, recipe, build_table)
+
+        @param disk_cache DiskCache : Cache
+        @param recipe : A description of everything that determines the
+            waves, such as SigGen parameters and dsp operations and their
+            arguments. It is hashed by value, as by cache.digest().
+        @param build callable : Function which takes no arguments and returns
+            a WaveTable. It is only called if the recipe isn't cached.
+
+        @returns WaveTable : A read-only, memory-mapped wavetable if the
+            recipe was cached, otherwise the result of build
+        """
+
+        key = ('WaveTable.from_cache', recipe)
+        waves = disk_cache.get(key)
+
+        if waves is not None:
+            return cls.from_array(waves)
+
+        table = build()
+        disk_cache.put(key, table.as_array())
+
+        return table
+
+    @classmethod
+    def load(cls, filename, mmap=True):
+        """ Load a wavetable saved by save(). Use wtfile.read_info() to get
+        the sample rate and metadata stored with it.
+
+        @param filename str : Wavetable file name
+        @param mmap bool : If True, the waves are memory-mapped from the file
+            rather than read. The table can still be modified, which copies
+            the waves and leaves the file unchanged (default True).
+
+        @returns WaveTable : A contiguous wavetable
+        """
+
+        return cls.from_array(wtfile.read(filename, mmap))
+
+    def _adopt(self, waves):
+        """ Use an array of waves as the wave buffer without copying it, if
+        possible, otherwise copy it in
+
+        @param waves np.ndarray : A (waves, wave_len) array
+        """
+
+        if self.contiguous and waves.shape == (self.num_slots, self.wave_len):
+            self._buffer = waves
+            self._num_waves = self.num_slots
+        else:
+            self.waves = waves
+
+    def _sig_gen(self):
+        """ Get a SigGen which generates waves for this wavetable """
+
+        return sig.SigGen(num_points=self.wave_len, dtype=self.dtype,
+                          method=self.method)
+
+    def _allocate_buffer(self):
+        """ Allocate the contiguous wave buffer, if it doesn't already exist
+        with the correct shape """
+
+        shape = (self.num_slots, self.wave_len)
+
+        if self._buffer is None or self._buffer.shape != shape:
+            self._buffer = np.zeros(shape, dtype=self.dtype)
+            self._num_waves = 0
+
+    def _writable_buffer(self, keep=True):
+        """ Allocate the contiguous wave buffer, replacing it if it is
+        read-only, e.g. a memory-mapped array adopted from a file or cache,
+        so that it can be written to. The adopted array is left unchanged.
+
+        @param keep bool : If True, a read-only buffer is replaced with a
+            copy of it, otherwise with zeros
+        """
+
+        self._allocate_buffer()
+
+        if not self._buffer.flags.writeable:
+            if keep:
+                self._buffer = np.array(self._buffer)
+            else:
+                self._buffer = np.zeros_like(self._buffer)
+
+    def _fill_buffer(self, value):
+        """ Copy waves into the contiguous wave buffer, resampling them to
+        wave_len if required. Slots which are not filled are set to zero.
+
+        @param value sequence : A sequence of waves
+        """
+
+        num_waves = len(value)
+
+        if num_waves > self.num_slots:
+            msg = "Can't store {0} waves in a {1} slot wavetable"
+            raise ValueError(msg.format(num_waves, self.num_slots))
+
+        if self.wave_len is None:
+            self.wave_len = len(value[0])
+
+        self._writable_buffer(keep=False)
+
+        self._buffer[:num_waves] = self._sig_gen().arb_batch(value)
+
+        self._buffer[num_waves:] = 0
+        self._num_waves = num_waves
+
     def clear(self):
         """ Clear the wavetable so that all slots contain zero """
 
+        if self.contiguous:
+            if self._buffer is not None:
+                self._writable_buffer(keep=False)
+                self._buffer.fill(0)
+            self._num_waves = 0
+            return
+
         self.waves = []
 
     def get_wave_at_index(self, index):
@@ -77,9 +261,18 @@ class WaveTable(object):
 
         @param index int : The slot index to get the wave from
 
-        @returns np.ndarray : Wave at given index
+        @returns np.ndarray : Wave at given index. For a contiguous
+            wavetable, this is a view into the wave buffer.
         """
 
+        if self.contiguous:
+            if self.wave_len is None:
+                raise ValueError("Set wave_len or waves before calling get_wave_at_index")
+            if index >= self.num_slots:
+                return np.zeros(self.wave_len, dtype=self.dtype)
+            self._allocate_buffer()
+            return self._buffer[index]
+
         if self.wave_len is None:
             if self.waves:
                 self.wave_len = len(self._waves[0])
@@ -87,9 +280,9 @@ class WaveTable(object):
                 raise ValueError("Set wave_len or waves before calling get_wave_at_index")
 
         if index >= len(self.waves):
-            return np.zeros(self.wave_len)
+            return np.zeros(self.wave_len, dtype=self.dtype)
 
-        return sig.SigGen(num_points=self.wave_len).arb(self._waves[index])
+        return self._sig_gen().arb(self._waves[index])
 
     def get_waves(self):
         """ Get all of the waves in the table """
@@ -97,7 +290,82 @@ class WaveTable(object):
         for i in range(self.num_slots):
             yield self.get_wave_at_index(i)
 
-    def from_wav(self, filename, sig_gen=None, resynthesize=False):
+    def as_array(self):
+        """ Get all of the waves in the table as a single array
+
+            @returns np.ndarray : A (num_slots, wave_len) array. For a
+                contiguous wavetable, this is the wave buffer itself.
+        """
+
+        if self.contiguous:
+            if self.wave_len is None:
+                raise ValueError("Set wave_len or waves before calling as_array")
+            self._allocate_buffer()
+            return self._buffer
+
+        if self.wave_len is None and self._waves:
+            self.wave_len = len(self._waves[0])
+
+        if self.wave_len is None:
+            raise ValueError("Set wave_len or waves before calling as_array")
+
+        waves = np.zeros((self.num_slots, self.wave_len), dtype=self.dtype)
+        num_waves = min(len(self._waves), self.num_slots)
+
+        if num_waves:
+            waves[:num_waves] = self._sig_gen().arb_batch(
+                self._waves[:num_waves])
+
+        return waves
+
+    def chain(self, lru=chain.CACHE):
+        """ Start a lazily evaluated chain of dsp operations on the waves in
+            the table, e.g. table.chain().fold(1).clip(2).apply()
+
+            @param lru LRUCache : Cache to use for intermediate results, or
+                None to disable caching
+
+            @returns Chain : An empty chain with this wavetable as its source
+        """
+
+        return chain.Chain(self, lru)
+
+    @instrument.stage('WaveTable.get_mip_map')
+    def get_mip_map(self, octave, lru=mipmap.CACHE):
+        """ Get a band-limited copy of the wavetable for playback in a given
+            octave. Levels are cached by wave content, so repeated calls
+            reuse levels which have already been computed.
+
+            @param octave int : Mip-map level. Level 0 keeps all harmonics and
+                each level above that halves the number of harmonics.
+            @param lru LRUCache : Cache to use, or None to disable caching
+
+            @returns WaveTable : Band-limited wavetable
+        """
+
+        waves = mipmap.level(self.as_array(), octave, lru)
+
+        return WaveTable(self.num_slots, waves=waves, wave_len=self.wave_len,
+                         contiguous=self.contiguous, dtype=self.dtype)
+
+    def get_mip_maps(self, octaves=None, lru=mipmap.CACHE):
+        """ Get a band-limited copy of the wavetable for every octave
+
+            @param octaves int : Number of octaves, or None for all levels
+                down to the fundamental only
+            @param lru LRUCache : Cache to use, or None to disable caching
+
+            @returns list : A WaveTable for each octave
+        """
+
+        if octaves is None:
+            octaves = mipmap.num_octaves(self.wave_len)
+
+        return [self.get_mip_map(octave, lru) for octave in range(octaves)]
+
+    @instrument.stage('WaveTable.from_wav')
+    def from_wav(self, filename, sig_gen=None, resynthesize=False,
+                 streaming=False, disk_cache=None):
         """
         Populate the wavetable from a wav file by filling all slots with
         cycles from a wav file.
@@ -108,45 +376,155 @@ class WaveTable(object):
             harmonic series of the original signal - works best on signals with
             a low findamental frequency (< 200 Hz). If False, n evenly spaced
             single cycles are extracted from the input (default False).
+        @param streaming bool : If True, the wav file is read in chunks and
+            only the samples needed for each slot are loaded, for files which
+            are too large to hold in memory (default False).
+        @param disk_cache DiskCache : If given, the waves are looked up in
+            the cache by the contents of the wav file and the arguments, and
+            are only computed and stored if they are not found. Cached waves
+            are memory-mapped and read-only.
 
         @returns WaveTable : self, populated by content from the wav file
         settings as this one
         """
 
-        data, fs = wavfile.read(filename, with_sample_rate=True)
-
         if sig_gen is None:
-            sig_gen = sig.SigGen(num_points=self.wave_len)
+            sig_gen = self._sig_gen()
+
+        if disk_cache is not None:
+            key = ('WaveTable.from_wav', cache.file_digest(filename),
+                   self.num_slots, sig_gen.num_points,
+                   config.get_dtype(sig_gen.dtype).str, sig_gen.method,
+                   self.dtype.str, resynthesize, streaming)
+            waves = disk_cache.get(key)
+            if waves is not None:
+                self._adopt(waves)
+                return self
+
+        if streaming:
+            self._from_wav_stream(filename, sig_gen, resynthesize)
+        else:
+            data, fs = wavfile.read(filename, with_sample_rate=True,
+                                    dtype=self.dtype)
 
-        if resynthesize:
+            if resynthesize:
+                self._resynthesize(data, sig_gen)
+            else:
+                cycles = dsp.slice_cycles(data, self.num_slots, fs)
+                self.waves = list(sig_gen.arb_batch(cycles))
 
-            num_sections = self.num_slots
+        if disk_cache is not None:
+            disk_cache.put(key, np.asarray(self.waves, dtype=self.dtype))
 
-            # if the input has insufficient data, loop it a number of times
-            min_data_len = num_sections * 501
-            while data.size < min_data_len:
-                data = np.tile(data, 2)
+        return self
 
-            while True:
-                data = data[:data.size - (data.size % num_sections)]
-                sections = np.split(data, num_sections)
-                try:
-                    self.waves = [dsp.resynthesize(s, sig_gen) for s in sections]
-                    break
-                except dsp.NotEnoughSamplesError as exc:
-                    num_sections -= 1
-                    if num_sections <= 0:
-                        raise exc
+    def _from_wav_stream(self, filename, sig_gen, resynthesize):
+        """ Populate the wavetable from a wav file without loading the whole
+        file into memory.
 
-            if num_sections < self.num_slots:
-                self.waves = sig.morph(self.waves, self.num_slots)
+        @param filename str : Wav file name.
+        @param sig_gen SigGen : SigGen to use for regenerating the signal.
+        @param resynthesize : If True, the signal is resynthesised, otherwise
+            cycles are sliced from the input.
+        """
 
-        else:
-            cycles = dsp.slice_cycles(data, self.num_slots, fs)
-            self.waves = [sig_gen.arb(c) for c in cycles]
+        with wavfile.StreamReader(filename, dtype=self.dtype) as reader:
+
+            if resynthesize:
+
+                section_len = reader.frames // self.num_slots
+
+                if section_len < 501:
+                    # small enough to be looped in memory
+                    self._resynthesize(reader.read(0, reader.frames), sig_gen)
+                else:
+                    # only the start of each section is analysed
+                    num = min(section_len, dsp.HARMONIC_SERIES_LEN)
+                    sections = np.array(
+                        [reader.read(i * section_len, num)
+                         for i in range(self.num_slots)])
+                    self.waves = dsp.resynthesize(sections, sig_gen)
+
+            else:
+                cycles = dsp.slice_cycles_stream(
+                    reader.read, reader.frames, self.num_slots,
+                    reader.samplerate)
+                self.waves = list(sig_gen.arb_batch(cycles))
+
+        return self
+
+    def _resynthesize(self, data, sig_gen):
+        """ Fill the wavetable by resynthesizing sections of a signal
+
+        @param data np.ndarray : Signal
+        @param sig_gen SigGen : SigGen to use for regenerating the signal.
+        """
+
+        num_sections = self.num_slots
+
+        # if the input has insufficient data, loop it a number of times
+        min_data_len = num_sections * 501
+        repeats = 1
+        while data.size * repeats < min_data_len:
+            repeats *= 2
+        if repeats > 1:
+            data = np.tile(data, repeats)
+
+        while True:
+            data = data[:data.size - (data.size % num_sections)]
+            sections = data.reshape(num_sections, -1)
+            try:
+                self.waves = dsp.resynthesize(sections, sig_gen)
+                break
+            except dsp.NotEnoughSamplesError as exc:
+                num_sections -= 1
+                if num_sections <= 0:
+                    raise exc
+
+        if num_sections < self.num_slots:
+            if self.contiguous:
+                sig.morph(self.waves, self.num_slots, out=self._buffer)
+                self._num_waves = self.num_slots
+            else:
+                self.waves = sig.morph(self.waves, self.num_slots,
+                                       dtype=self.dtype)
+
+    @instrument.stage('WaveTable.from_harmonics')
+    def from_harmonics(self, harmonics=None, magnitudes=None, phases=None,
+                       max_harmonic=None):
+        """
+        Populate the wavetable by additive synthesis, rendering all slots
+        with a single inverse FFT.
+
+        @param harmonics np.ndarray : A (slots, harmonics) array of complex
+            amplitudes, where column 0 is the fundamental. The magnitude and
+            angle of each value give the amplitude and phase of a sine wave.
+        @param magnitudes np.ndarray : A (slots, harmonics) array of
+            amplitudes, used if harmonics is not given.
+        @param phases np.ndarray : Phases in radians to use with magnitudes
+            (default 0).
+        @param max_harmonic int : Highest harmonic to include, where 1 is the
+            fundamental.
+
+        @returns WaveTable : self, populated with the synthesized waves
+        """
+
+        if self.wave_len is None:
+            raise ValueError("Set wave_len before calling from_harmonics")
+
+        if harmonics is None:
+            if magnitudes is None:
+                raise ValueError("Either harmonics or magnitudes must be given")
+            if phases is None:
+                phases = 0
+            harmonics = magnitudes * np.exp(1j * np.asarray(phases))
+
+        self.waves = dsp.additive(np.atleast_2d(harmonics), self.wave_len,
+                                  max_harmonic, self.dtype)
 
         return self
 
+    @instrument.stage('WaveTable.morph_with')
     def morph_with(self, other, in_place=False):
         """ Morph waves with contents of another wavetable
 
@@ -157,35 +535,112 @@ class WaveTable(object):
                 the morph
         """
 
+        if self.contiguous:
+            return self._morph_buffer_with(other, in_place)
+
         waves = [None for _ in range(self.num_slots)]
 
+        # interpolate the waves of other to the same length as ours
+        wavs_b = [other.get_wave_at_index(i) for i in range(self.num_slots)]
+        if other.wave_len != self.wave_len:
+            wavs_b = self._sig_gen().arb_batch(wavs_b)
+
         for i in range(self.num_slots):
             wav_a = self.get_wave_at_index(i)
-            wav_b = other.get_wave_at_index(i)
-            # interpolate wav_b to the same length as a
-            if other.wave_len != self.wave_len:
-                wav_b = sig.SigGen(num_points=self.wave_len).arb(wav_b)
-            waves[i] = sig.morph([wav_a, wav_b], 3)[1]
+            waves[i] = sig.morph([wav_a, wavs_b[i]], 3, dtype=self.dtype)[1]
 
         if in_place:
             self.waves = waves
             return self
 
-        return WaveTable(self.num_slots, waves=waves, wave_len=self.wave_len)
+        return WaveTable(self.num_slots, waves=waves, wave_len=self.wave_len,
+                         dtype=self.dtype)
+
+    def _morph_buffer_with(self, other, in_place):
+        """ Morph the contiguous wave buffer with contents of another
+        wavetable, processing all slots at once.
+
+            @param other WaveTable : other wavetable
+            @param in_place bool : If True, the result is written to this
+                WaveTable's buffer.
+        """
+
+        wavs_a = self.as_array()
+        wavs_b = other.as_array()[:self.num_slots]
+
+        # interpolate wavs_b to the same length as a
+        if other.wave_len != self.wave_len:
+            wavs_b = self._sig_gen().arb_batch(wavs_b)
 
-    def to_wav(self, filename, samplerate=44100):
+        # slots which other doesn't have are morphed with silence, as by
+        # get_wave_at_index
+        if len(wavs_b) < self.num_slots:
+            padded = np.zeros_like(wavs_a)
+            padded[:len(wavs_b)] = wavs_b
+            wavs_b = padded
+
+        if in_place:
+            morphed = self
+        else:
+            morphed = WaveTable(self.num_slots, wave_len=self.wave_len,
+                                contiguous=True, dtype=self.dtype)
+
+        # pylint: disable=protected-access
+        morphed._writable_buffer(keep=False)
+        np.multiply(wavs_a, 0.5, out=morphed._buffer)
+        morphed._buffer += wavs_b * 0.5
+        morphed._num_waves = self.num_slots
+
+        return morphed
+
+    @instrument.stage('WaveTable.to_wav')
+    def to_wav(self, filename, samplerate=44100, sample_format='PCM_16'):
         """ Write the wavetable to a wav file
 
             @param filename str : wav file name
             @param samplerate int : sample rate in Hz
+            @param sample_format str : 'PCM_16', 'PCM_24' or 'FLOAT'
+        """
+
+        wavfile.write_wavetable(self, filename, samplerate, sample_format)
+
+    def export(self, targets, samplerate=44100, threads=None):
+        """ Write the wavetable to several files at once, e.g.
+
+            wt.export(['table.wav', ('table24.wav', 'wav24'), 'table.h2p'])
+
+            @param targets seq : File names, or (file name, format) pairs,
+                where the format is one of those in export.WRITERS. The
+                format of a file name on its own is found from its
+                extension.
+            @param samplerate int : sample rate in Hz
+            @param threads int : If given, files are written concurrently
+                using this many threads
+
+            @returns list : The file names written
+        """
+
+        return export.export(self, targets, samplerate, threads)
+
+    def save(self, filename, samplerate=44100, metadata=None):
+        """ Save the wavetable to a binary wavetable file, at full precision,
+        which can be loaded with WaveTable.load
+
+            @param filename str : Wavetable file name
+            @param samplerate int : Sample rate in Hz
+            @param metadata : Anything which can be serialized as JSON, e.g.
+                the parameters used to generate the waves
         """
 
-        wavfile.write_wavetable(self, filename, samplerate)
+        wtfile.write_wavetable(self, filename, samplerate, metadata)
 
-    def to_h2p(self, filename):
+    @instrument.stage('WaveTable.to_h2p')
+    def to_h2p(self, filename, processes=None):
         """ Write the wavetable to a Zebra2 hp2 file
 
             @param filename str : wav file name
+            @param processes int : If given, format slots in parallel using
+                this many worker processes
         """
 
-        zosc.write_wavetable(self, filename)
+        zosc.write_wavetable(self, filename, processes)
@@ -24,65 +24,196 @@ try:
 except ImportError:
     HAS_SOUNDFILE = False
 
-import wave
+import os
 import struct
 import numpy as np
 
+from osc_gen import config
+from osc_gen import instrument
 
-def _float_to_ibytes(vals):
-    """ Convert a sequence of vals to 16-bit bytes """
 
-    num = len(vals)
-    afloats = np.array(vals)
-    afloats = (afloats * 32768).astype('int')
-    np.clip(afloats, -32768, 32767, out=afloats)
-    return struct.pack('<{0}h'.format(num), *(aval for aval in afloats))
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
 
+# sample formats that can be written, named as in soundfile
+SAMPLE_FORMATS = {
+    'PCM_16': (WAVE_FORMAT_PCM, 16),
+    'PCM_24': (WAVE_FORMAT_PCM, 24),
+    'FLOAT': (WAVE_FORMAT_IEEE_FLOAT, 32),
+}
 
-def _ibytes_to_float(vals):
 
-    num = len(vals)
-    num = int(num / 4)
-    afloats = struct.unpack('<{0}h'.format(num), vals)
-    afloats = np.array(afloats).astype(float)
-    afloats /= 32768.0
-    return afloats
+def _parse_header(filename):
+    """ Parse the RIFF header of a wav file
 
+        @returns dict : format tag, number of channels, sample rate, bits per
+            sample, and the byte offset and number of frames of the sample
+            data
+    """
 
-def _read_using_wave(filename):
+    file_size = os.path.getsize(filename)
+    info = {}
 
-    wave_file = wave.open(filename, 'r')
+    with open(filename, 'rb') as wav_file:
 
-    if wave_file.getnchannels() != 1:
-        raise ValueError("only mono supported")
+        riff, _, wave_id = struct.unpack('<4sI4s', wav_file.read(12))
+        if riff != b'RIFF' or wave_id != b'WAVE':
+            raise ValueError("{0} is not a wav file".format(filename))
 
-    if wave_file.getsampwidth() != 2:
-        raise ValueError("only 16 bit supported")
+        while True:
 
-    num_frames = wave_file.getnframes()
-    data = _ibytes_to_float(wave_file.readframes(num_frames))
-    fs = wave_file.getframerate()
+            chunk_header = wav_file.read(8)
+            if len(chunk_header) < 8:
+                raise ValueError("No data chunk found in {0}".format(filename))
 
-    return data, fs
+            chunk_id, chunk_size = struct.unpack('<4sI', chunk_header)
 
+            if chunk_id == b'fmt ':
+                fmt = wav_file.read(chunk_size)
+                (info['format'], info['channels'], info['samplerate'], _,
+                 info['block_align'], info['bits']) = struct.unpack(
+                     '<HHIIHH', fmt[:16])
+                if info['format'] == WAVE_FORMAT_EXTENSIBLE:
+                    # the format tag is the start of the sub-format GUID
+                    info['format'] = struct.unpack('<H', fmt[24:26])[0]
+                wav_file.seek(chunk_size % 2, 1)
 
-def read(filename, with_sample_rate=False):
-    """ Read wav file and convert to normalized float """
+            elif chunk_id == b'data':
+                if 'format' not in info:
+                    raise ValueError("No fmt chunk found in {0}".format(filename))
+                info['offset'] = wav_file.tell()
+                # the size may be unset or wrong if the file was not closed
+                data_size = min(chunk_size, file_size - info['offset'])
+                info['frames'] = data_size // info['block_align']
+                return info
+
+            else:
+                wav_file.seek(chunk_size + chunk_size % 2, 1)
+
+
+def _map(filename):
+    """ Map the sample data of a wav file into memory
+
+        @returns tuple : (samples, header info)
+    """
+
+    info = _parse_header(filename)
+    shape = (info['frames'], info['channels'])
+
+    if info['format'] == WAVE_FORMAT_PCM:
+        dtypes = {8: 'u1', 16: '<i2', 24: 'u1', 32: '<i4'}
+    elif info['format'] == WAVE_FORMAT_IEEE_FLOAT:
+        dtypes = {32: '<f4', 64: '<f8'}
+    else:
+        raise ValueError("Unsupported wav format ({0})".format(info['format']))
+
+    if info['bits'] not in dtypes:
+        raise ValueError("Unsupported bit depth ({0})".format(info['bits']))
+
+    if info['bits'] == 24:
+        shape += (3,)
+
+    if not info['frames']:
+        return np.zeros(shape, dtype=dtypes[info['bits']]), info
+
+    samples = np.memmap(filename, dtype=dtypes[info['bits']], mode='r',
+                        offset=info['offset'], shape=shape)
+
+    return samples, info
+
+
+def memmap(filename):
+    """ Map the sample data of a wav file into memory without reading or
+        converting it. Supports 8, 16, 24 and 32 bit PCM and 32 and 64 bit
+        float data.
+
+        @param filename str : Wav file name
+
+        @returns tuple : (samples, sample rate), where samples is a read-only
+            (frames, channels) array of the stored samples. For 24 bit data,
+            samples is a (frames, channels, 3) array of bytes. Use to_float()
+            to convert samples.
+    """
+
+    samples, info = _map(filename)
+
+    return samples, info['samplerate']
+
+
+def to_float(samples, dtype=None, bits=None):
+    """ Convert samples returned by memmap() to floats in the range +/- 1
+
+        @param samples np.ndarray : Samples, or a slice of samples
+        @param dtype : Floating point dtype of the result. Defaults to
+            config.DTYPE.
+        @param bits int : Bits per sample in the file. Defaults to the size
+            of the samples dtype, so must be given as 24 for 24 bit data,
+            whose last axis holds the 3 bytes of each sample.
+    """
+
+    samples = np.asarray(samples)
+    dtype = config.get_dtype(dtype)
+
+    if bits == 24:
+        # 24 bit, shift into the top of an int32 to sign-extend
+        padded = np.zeros(samples.shape[:-1] + (4,), dtype=np.uint8)
+        padded[..., 1:] = samples
+        data = (padded.view('<i4')[..., 0] >> 8).astype(dtype)
+        data /= float(1 << 23)
+        return data
+
+    data = samples.astype(dtype)
+
+    if samples.dtype == np.uint8:
+        data -= 128
+        data /= 128
+    elif samples.dtype.kind == 'i':
+        data /= float(1 << (8 * samples.dtype.itemsize - 1))
+
+    return data
+
+
+def _read_using_memmap(filename, channel=0, dtype=None):
+
+    samples, info = _map(filename)
+
+    return (to_float(samples[:, channel], dtype, info['bits']),
+            info['samplerate'])
+
+
+def _soundfile_dtype(dtype):
+    """ Get the name of the closest dtype supported by soundfile """
+
+    return 'float64' if dtype.itemsize > 4 else 'float32'
+
+
+@instrument.stage('wavfile.read')
+def read(filename, with_sample_rate=False, channel=0, dtype=None):
+    """ Read wav file and convert to normalized float
+
+        @param filename str : Wav file name
+        @param with_sample_rate bool : If True, return the sample rate too
+        @param channel int : Index of the channel to read
+        @param dtype : Floating point dtype of the samples. Defaults to
+            config.DTYPE.
+    """
+
+    dtype = config.get_dtype(dtype)
 
     if HAS_SOUNDFILE:
-        data, fs = sf.read(filename)
-        # take only the first channel of the audio
-        if len(data.shape) > 1:
-            data = np.swapaxes(data, 0, 1)[0]
+        data, fs = sf.read(filename, always_2d=True,
+                           dtype=_soundfile_dtype(dtype))
+        data = data[:, channel]
     else:
-        data, fs = _read_using_wave(filename)
+        data, fs = _read_using_memmap(filename, channel, dtype)
 
     # center on 0
-    data = data.astype(float)
-    data -= np.mean(data)
+    data = data.astype(dtype)
+    data -= np.mean(data, dtype=np.float64)
 
     # normalize to +/- 1.0
-    data_max = max(abs(data))
+    data_max = np.amax(np.abs(data))
     data /= data_max
 
     if with_sample_rate:
@@ -91,24 +222,196 @@ def read(filename, with_sample_rate=False):
     return data
 
 
-def write(data, filename, samplerate=44100):
-    """ Write wav file """
+class StreamReader(object):
+    """ Read one channel of a wav file in chunks, without loading the
+    whole file into memory. Samples are centred and normalized using
+    statistics gathered in a streaming pass over the file, so that they match
+    the output of read(). """
+
+    def __init__(self, filename, chunk_size=1 << 16, channel=0, dtype=None):
+        """
+        Init
+
+        @param filename str : Wav file name
+        @param chunk_size int : Number of frames to read at a time when
+            gathering statistics
+        @param channel int : Index of the channel to read
+        @param dtype : Floating point dtype of the samples. Defaults to
+            config.DTYPE.
+        """
+
+        self.chunk_size = chunk_size
+        self.channel = channel
+        self.dtype = config.get_dtype(dtype)
+        self._mean = None
+        self._scale = None
+
+        if HAS_SOUNDFILE:
+            self._file = sf.SoundFile(filename)
+            self.frames = self._file.frames
+            self.samplerate = self._file.samplerate
+        else:
+            self._file = None
+            self._samples, info = _map(filename)
+            self._bits = info['bits']
+            self.samplerate = info['samplerate']
+            self.frames = len(self._samples)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """ Close the file """
+
+        if self._file is not None:
+            self._file.close()
+
+    def read_raw(self, start, num):
+        """ Read samples without normalization
+
+            @param start int : Index of the first frame to read
+            @param num int : Number of frames to read
+        """
+
+        start = max(int(start), 0)
+        num = max(min(int(num), self.frames - start), 0)
+
+        if self._file is not None:
+            self._file.seek(start)
+            data = self._file.read(num, always_2d=True,
+                                   dtype=_soundfile_dtype(self.dtype))
+            return data[:, self.channel].astype(self.dtype)
+
+        return to_float(self._samples[start:start + num, self.channel],
+                        self.dtype, self._bits)
+
+    def chunks(self):
+        """ Iterate over the whole file in chunks of raw samples """
+
+        for start in range(0, self.frames, self.chunk_size):
+            yield self.read_raw(start, self.chunk_size)
+
+    @instrument.stage('wavfile.StreamReader.stats')
+    def stats(self):
+        """ Get the mean and the peak amplitude about the mean of the signal,
+            calculated in a single streaming pass the first time they are
+            requested.
+
+            @returns tuple : (mean, peak amplitude)
+        """
+
+        if self._mean is None:
+
+            total = 0.0
+            data_min = np.inf
+            data_max = -np.inf
+
+            for chunk in self.chunks():
+                total += np.sum(chunk, dtype=np.float64)
+                data_min = min(data_min, np.amin(chunk))
+                data_max = max(data_max, np.amax(chunk))
+
+            self._mean = total / self.frames
+            self._scale = max(data_max - self._mean, self._mean - data_min)
+
+        return self._mean, self._scale
+
+    @instrument.stage('wavfile.StreamReader.read')
+    def read(self, start, num):
+        """ Read centred and normalized samples
+
+            @param start int : Index of the first frame to read
+            @param num int : Number of frames to read
+        """
+
+        mean, scale = self.stats()
+        data = self.read_raw(start, num)
+        data -= mean
+        data /= scale
+
+        return data
+
+
+@instrument.stage('wavfile.encode')
+def encode(data, sample_format='PCM_16'):
+    """ Convert floats in the range +/- 1 to little-endian sample bytes
+
+        @param data np.ndarray : Samples. Multidimensional arrays, such as a
+            (slots, wave_len) wavetable, are encoded in row-major order.
+        @param sample_format str : One of SAMPLE_FORMATS
+    """
+
+    if sample_format not in SAMPLE_FORMATS:
+        raise ValueError("Unsupported sample format ({0})".format(sample_format))
+
+    data = np.asarray(data)
+
+    if sample_format == 'FLOAT':
+        return data.astype('<f4').tobytes()
+
+    bits = SAMPLE_FORMATS[sample_format][1]
+    scale = float(1 << (bits - 1))
+    ints = np.clip(data * scale, -scale, scale - 1).astype('<i4')
+
+    if bits == 16:
+        return ints.astype('<i2').tobytes()
+
+    # drop the most significant byte of each 32 bit sample
+    return ints.reshape(-1, 1).view(np.uint8)[:, :3].tobytes()
+
+
+def _write_frames(frames, filename, samplerate, sample_format):
+    """ Write encoded mono sample data to a wav file """
+
+    format_tag, bits = SAMPLE_FORMATS[sample_format]
+    block_align = bits // 8
+    pad = b'\x00' * (len(frames) % 2)
+
+    fmt = struct.pack('<HHIIHH', format_tag, 1, samplerate,
+                      samplerate * block_align, block_align, bits)
+    chunks = [b'fmt ', struct.pack('<I', len(fmt)), fmt]
+
+    if format_tag != WAVE_FORMAT_PCM:
+        # non-PCM formats need a fact chunk giving the number of frames
+        chunks += [b'fact', struct.pack('<II', 4, len(frames) // block_align)]
+
+    chunks += [b'data', struct.pack('<I', len(frames))]
+    header = b''.join(chunks)
+
+    with open(filename, 'wb') as wav_file:
+        wav_file.write(b'RIFF')
+        wav_file.write(struct.pack('<I', 4 + len(header) + len(frames) + len(pad)))
+        wav_file.write(b'WAVE')
+        wav_file.write(header)
+        wav_file.write(frames)
+        wav_file.write(pad)
+
+
+@instrument.stage('wavfile.write')
+def write(data, filename, samplerate=44100, sample_format='PCM_16'):
+    """ Write wav file
+
+        @param data np.ndarray : Samples in the range +/- 1
+        @param filename str : Wav file name
+        @param samplerate int : Sample rate in Hz
+        @param sample_format str : One of SAMPLE_FORMATS
+    """
+
+    _write_frames(encode(data, sample_format), filename, samplerate,
+                  sample_format)
 
-    wave_file = wave.open(filename, 'w')
-    wave_file.setframerate(samplerate)
-    wave_file.setnchannels(1)
-    wave_file.setsampwidth(2)
-    wave_file.writeframes(_float_to_ibytes(data))
-    wave_file.close()
 
+def write_wavetable(wavetable, filename, samplerate=44100,
+                    sample_format='PCM_16'):
+    """ Write wavetable to file
 
-def write_wavetable(wavetable, filename, samplerate=44100):
-    """ Write wavetable to file """
+        @param wavetable WaveTable : Wavetable
+        @param filename str : Wav file name
+        @param samplerate int : Sample rate in Hz
+        @param sample_format str : One of SAMPLE_FORMATS
+    """
 
-    wave_file = wave.open(filename, 'w')
-    wave_file.setframerate(samplerate)
-    wave_file.setnchannels(1)
-    wave_file.setsampwidth(2)
-    for wt_wave in wavetable.get_waves():
-        wave_file.writeframes(_float_to_ibytes(wt_wave))
-    wave_file.close()
+    write(wavetable.as_array(), filename, samplerate, sample_format)
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Copyright 2019 Harvey Ormston
+
+This file is part of osc_gen.
+
+    osc_gen is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    osc_gen is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with osc_gen.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import json
+import struct
+
+import numpy as np
+
+from osc_gen import instrument
+
+MAGIC = b'OSCW'
+VERSION = 1
+
+# magic, version, data offset, slots, wave length, sample rate, dtype and
+# metadata length, followed by the metadata and then the sample data
+_HEADER = struct.Struct('<4sHxxIIII4sI')
+
+# the sample data starts at a multiple of this many bytes
+_ALIGN = 64
+
+
+def _parse_header(filename):
+    """ Parse the header of a wavetable file
+
+        @returns dict : number of slots, wave length, sample rate, sample
+            dtype, metadata, and the byte offset of the sample data
+    """
+
+    with open(filename, 'rb') as wt_file:
+
+        header = wt_file.read(_HEADER.size)
+        if len(header) < _HEADER.size or header[:4] != MAGIC:
+            raise ValueError("{0} is not a wavetable file".format(filename))
+
+        (_, version, offset, num_slots, wave_len, samplerate, dtype,
+         meta_len) = _HEADER.unpack(header)
+
+        if version > VERSION:
+            raise ValueError("Unsupported wavetable file version ({0})".format(
+                version))
+
+        metadata = wt_file.read(meta_len).decode('utf-8')
+
+    return {
+        'num_slots': num_slots,
+        'wave_len': wave_len,
+        'samplerate': samplerate,
+        'dtype': np.dtype(dtype.rstrip(b'\0').decode('ascii')),
+        'metadata': json.loads(metadata) if metadata else None,
+        'offset': offset,
+    }
+
+
+def read_info(filename):
+    """ Read the header of a wavetable file, without its sample data
+
+        @param filename str : Wavetable file name
+
+        @returns dict : 'num_slots', 'wave_len', 'samplerate', 'dtype' and
+            'metadata'
+    """
+
+    info = _parse_header(filename)
+    del info['offset']
+
+    return info
+
+
+@instrument.stage('wtfile.read')
+def read(filename, mmap=True):
+    """ Read the waves from a wavetable file
+
+        @param filename str : Wavetable file name
+        @param mmap bool : If True, the sample data is memory-mapped rather
+            than read, and is read-only (default True)
+
+        @returns np.ndarray : A (num_slots, wave_len) array of waves
+    """
+
+    info = _parse_header(filename)
+    shape = (info['num_slots'], info['wave_len'])
+
+    if not mmap or not info['num_slots'] * info['wave_len']:
+        with open(filename, 'rb') as wt_file:
+            wt_file.seek(info['offset'])
+            waves = np.fromfile(wt_file, dtype=info['dtype'],
+                                count=shape[0] * shape[1])
+        return waves.reshape(shape).astype(info['dtype'].newbyteorder('='),
+                                           copy=False)
+
+    return np.memmap(filename, dtype=info['dtype'], mode='r',
+                     offset=info['offset'], shape=shape)
+
+
+@instrument.stage('wtfile.write')
+def write(waves, filename, samplerate=44100, metadata=None):
+    """ Write waves to a wavetable file
+
+        @param waves np.ndarray : A (num_slots, wave_len) array of waves
+        @param filename str : Wavetable file name
+        @param samplerate int : Sample rate in Hz
+        @param metadata : Anything which can be serialized as JSON, e.g. the
+            parameters used to generate the waves
+    """
+
+    waves = np.asarray(waves)
+
+    if waves.ndim != 2:
+        raise ValueError("Expected a 2D array of waves, got {0} "
+                         "dimensions".format(waves.ndim))
+    if not np.issubdtype(waves.dtype, np.floating):
+        raise ValueError("Expected floating point waves, got {0}".format(
+            waves.dtype))
+
+    dtype = waves.dtype.newbyteorder('<')
+    meta = b'' if metadata is None else json.dumps(
+        metadata, sort_keys=True).encode('utf-8')
+
+    offset = -(-(_HEADER.size + len(meta)) // _ALIGN) * _ALIGN
+    header = _HEADER.pack(MAGIC, VERSION, offset, waves.shape[0],
+                          waves.shape[1], samplerate,
+                          dtype.str.encode('ascii'), len(meta))
+
+    with open(filename, 'wb') as wt_file:
+        wt_file.write(header)
+        wt_file.write(meta)
+        wt_file.write(b'\0' * (offset - _HEADER.size - len(meta)))
+        np.ascontiguousarray(waves, dtype=dtype).tofile(wt_file)
+
+
+def write_wavetable(wavetable, filename, samplerate=44100, metadata=None):
+    """ Write wavetable to file
+
+        @param wavetable WaveTable : Wavetable
+        @param filename str : Wavetable file name
+        @param samplerate int : Sample rate in Hz
+        @param metadata : Anything which can be serialized as JSON
+    """
+
+    write(wavetable.as_array(), filename, samplerate, metadata)
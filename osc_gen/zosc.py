@@ -18,54 +18,97 @@ This file is part of osc_gen.
     along with osc_gen.  If not, see <https://www.gnu.org/licenses/>.
 """
 
+from multiprocessing import Pool
 
-def write_wavetable(wavetable, filename):
-    """ Write wavetable to an h2p oscillator file
+import numpy as np
 
-        @param wavetable zwave.WaveTable : Wavetable
+from osc_gen import cache
+from osc_gen import instrument
+
+# formatting templates, keyed by table size
+_TEMPLATES = cache.LRUCache(maxsize=8)
+
+
+def _template(table_size):
+    """ Get a template which formats all of the values in a table with a
+        single string formatting operation
+
+        @param table_size int : Number of values in the table
+    """
+
+    template = _TEMPLATES.get(table_size)
+
+    if template is None:
+        template = ''.join('Wave[{0}] = %.10f;\n'.format(i)
+                           for i in range(table_size))
+        _TEMPLATES.put(table_size, template)
+
+    return template
+
+
+def _format_table(args):
+    """ Format one table block
+
+        @param args tuple : (table number, wave)
+    """
+
+    wave_num, wave = args
+
+    # scale to avoid overflow resulting from finite precision
+    scaled_wave = wave * 0.999969
+
+    return "".join((
+        "//table {0}\n".format(wave_num),
+        _template(len(scaled_wave)) % tuple(scaled_wave.tolist()),
+        "Selected.WaveTable.set({0}, Wave);\n\n".format(wave_num)))
+
+
+@instrument.stage('zosc.write')
+def write(waves, filename, processes=None):
+    """ Write waves to an h2p oscillator file
+
+        @param waves np.ndarray : A (num_slots, wave_len) array of waves
         @param filename str : File name to write to
+        @param processes int : If given, tables are formatted in parallel
+            using this many worker processes, which is worthwhile for very
+            large wavetables.
     """
 
-    table_size = wavetable.wave_len
+    tables = [(i + 1, wave) for i, wave in enumerate(waves)]
 
-    if table_size is None:
-        return
+    if processes:
+        pool = Pool(processes)
+        try:
+            blocks = pool.map(_format_table, tables)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        blocks = [_format_table(table) for table in tables]
 
     with open(filename, 'w') as osc_file:
+        osc_file.write("".join([
+            "#defaults=no\n",
+            "#cm=OSC\n",
+            "Wave=2\n",
+            "<?\n",
+            "\n",
+            "float Wave[{0}];\n".format(np.shape(waves)[-1]),
+            "\n"] + blocks + ["?>"]))
+
+
+@instrument.stage('zosc.write_wavetable')
+def write_wavetable(wavetable, filename, processes=None):
+    """ Write wavetable to an h2p oscillator file
+
+        @param wavetable zwave.WaveTable : Wavetable
+        @param filename str : File name to write to
+        @param processes int : If given, tables are formatted in parallel
+            using this many worker processes, which is worthwhile for very
+            large wavetables.
+    """
+
+    if wavetable.wave_len is None:
+        return
 
-        osc_file.write("#defaults=no\n")
-        osc_file.write("#cm=OSC\n")
-        osc_file.write("Wave=2\n")
-        osc_file.write("<?\n")
-        osc_file.write("\n")
-
-        osc_file.write("float Wave[")
-        osc_file.write(str(table_size))
-        osc_file.write("];\n")
-        osc_file.write("\n")
-
-        for i, wave in enumerate(wavetable.get_waves()):
-
-            if wave is None:
-                continue
-
-            wave_num = i + 1
-            # scale to avoid overflow resulting from finite precision
-            scaled_wave = wave * 0.999969
-            osc_file.write("//table ")
-            osc_file.write(str(wave_num))
-            osc_file.write("\n")
-
-            for index, value in enumerate(scaled_wave):
-                osc_file.write("Wave[")
-                osc_file.write(str(index))
-                osc_file.write("] = ")
-                osc_file.write('{0:.10f}'.format(value))
-                osc_file.write(";\n")
-
-            osc_file.write("Selected.WaveTable.set(")
-            osc_file.write(str(wave_num))
-            osc_file.write(", Wave);\n")
-            osc_file.write("\n")
-
-        osc_file.write("?>")
+    write(wavetable.as_array(), filename, processes)
@@ -81,7 +81,7 @@ setup(
     },
     packages=['osc_gen'],
     install_requires=[
-        "numpy>=1.11.3",
+        "numpy>=1.16",
         "scipy>=0.18.1",
         "pysoundfile"],
     python_requires='>=2.7, !=3.0.*, !=3.1.*, !=3.2.*, !=3.3.*, !=3.4.*, <4',
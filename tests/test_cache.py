@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Copyright 2019 Harvey Ormston
+
+This file is part of osc_gen.
+
+    osc_gen is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    osc_gen is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with osc_gen.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import os
+
+import numpy as np
+
+from osc_gen import cache
+
+
+def test_lru_eviction():
+    """ test the least recently used item is discarded """
+    lru = cache.LRUCache(maxsize=2)
+    lru.put('a', 1)
+    lru.put('b', 2)
+    assert lru.get('a') == 1
+    lru.put('c', 3)
+    assert 'a' in lru
+    assert 'b' not in lru
+    assert len(lru) == 2
+
+
+def test_lru_counters():
+    """ test hit and miss counters """
+    lru = cache.LRUCache()
+    lru.put('a', 1)
+    lru.get('a')
+    lru.get('b')
+    info = lru.info()
+    assert info['hits'] == 1
+    assert info['misses'] == 1
+    lru.clear()
+    assert lru.info() == {'hits': 0, 'misses': 0, 'size': 0, 'maxsize': 128}
+
+
+def test_digest():
+    """ test content is hashed by value """
+    a = {'amp': 0.5, 'waves': [np.arange(4.), 'saw']}
+    b = {'waves': [np.arange(4.), 'saw'], 'amp': 0.5}
+    assert cache.digest(a) == cache.digest(b)
+    assert cache.digest(a) != cache.digest(np.arange(4.))
+    assert cache.digest(np.arange(4.)) != cache.digest(np.arange(4))
+
+
+def test_disk_cache(tmp_path):
+    """ test storing and memory-mapping arrays """
+    disk = cache.DiskCache(str(tmp_path / 'cache'))
+    a = np.arange(12, dtype=np.float32).reshape(3, 4)
+    assert disk.get('a') is None
+    disk.put('a', a)
+    o = disk.get('a')
+    assert isinstance(o, np.memmap)
+    assert np.all(o == a)
+    assert not o.flags.writeable
+    info = disk.info()
+    assert (info['hits'], info['misses'], info['size']) == (1, 1, 1)
+    disk.clear()
+    assert disk.get('a') is None
+
+
+def test_disk_cache_eviction(tmp_path):
+    """ test the least recently used file is deleted when full """
+    disk = cache.DiskCache(str(tmp_path))
+    for i, key in enumerate('abc'):
+        disk.put(key, np.zeros(256))
+        path = disk._path(key)  # pylint: disable=protected-access
+        os.utime(path, (i, i))
+    disk.max_bytes = 3 * os.path.getsize(path)
+    disk.put('d', np.zeros(256))
+    assert disk.get('a') is None
+    for key in 'bcd':
+        assert disk.get(key) is not None
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Copyright 2019 Harvey Ormston
+
+This file is part of osc_gen.
+
+    osc_gen is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    osc_gen is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with osc_gen.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from __future__ import division
+
+import numpy as np
+import pytest
+
+from osc_gen import cache, chain, dsp, sig, wavetable
+
+
+def _cycles():
+    """ make a batch of cycles which are not normalized """
+    sgen = sig.SigGen(num_points=256)
+    return np.stack([sgen.saw() * (i + 1) / 8 + 0.25 * sgen.sin()
+                     for i in range(8)]).astype(np.float64)
+
+
+def _eager(inp, ops):
+    """ apply operations using the dsp functions """
+    outp = inp.copy()
+    for op in ops:
+        outp = getattr(dsp, op[0])(outp, *op[1:])
+    return outp
+
+
+@pytest.mark.parametrize('batch', [None, 3])
+def test_chain_matches_eager(batch):
+    """ test a chain gives the same result as applying each function """
+    a = _cycles()
+    e = a.copy()
+    c = chain.Chain(a, lru=None).fold(1.5, 0.1).slew(0.3).downsample(3) \
+        .clip(2).band_limit(32).slew(0.2, True).quantize(4)
+    o = c.evaluate(batch)
+    assert np.allclose(o, _eager(a, c.ops))
+    assert np.all(a == e)
+
+
+def test_chain_quantize_exact():
+    """ test deferred normalization matches eager exactly before quantize,
+    where a rounding difference would change a whole quantization step """
+    sgen = sig.SigGen(num_points=2048)
+    a = np.stack([sgen.saw() * 0.7 + 0.3 * sgen.sin() + 0.1,
+                  sgen.sin() * 1.3 - 0.2]).astype(np.float64)
+    for c in (chain.Chain(a, lru=None).fold(1).downsample(2).quantize(3),
+              chain.Chain(a, lru=None).slew(0.3).quantize(4)):
+        assert np.all(c.evaluate() == _eager(a, c.ops))
+
+
+def test_chain_single_cycle():
+    """ test a chain on a single cycle """
+    a = _cycles()[3]
+    c = chain.Chain(a, lru=None).shape(0.5).tube(1)
+    o = c.evaluate()
+    assert o.shape == a.shape
+    assert np.allclose(o, _eager(a, c.ops))
+
+
+def test_chain_branch_cache():
+    """ test branches share the evaluation of their common prefix """
+    a = _cycles()
+    lru = cache.LRUCache()
+    base = chain.Chain(a, lru=lru).fold(1).slew(0.5)
+    left = base.clip(1)
+    right = base.tube(2)
+    o = left.evaluate()
+    assert lru.hits == 0
+    assert not o.flags.writeable
+    o = right.evaluate()
+    assert lru.hits == 1
+    assert np.allclose(o, _eager(a, right.ops))
+    assert right.evaluate() is o
+
+
+def test_chain_branch_pending():
+    """ test branches off an operation which leaves its result to be
+    normalized """
+    a = _cycles()
+    base = chain.Chain(a, lru=cache.LRUCache()).tube(1, 0.3)
+    left = base.fold(1)
+    right = base.quantize(3)
+    assert np.allclose(left.evaluate(), _eager(a, left.ops))
+    assert np.allclose(right.evaluate(), _eager(a, right.ops))
+    assert np.allclose(base.evaluate(), _eager(a, base.ops))
+
+
+def test_chain_wavetable():
+    """ test applying a chain to a wavetable """
+    sgen = sig.SigGen(num_points=64)
+    wt = wavetable.WaveTable(2, waves=[sgen.sin(), sgen.tri()], wave_len=64,
+                             contiguous=True)
+    e = dsp.fold(wt.as_array().copy(), 2)
+    assert wt.chain(lru=None).fold(2).apply() is wt
+    assert np.allclose(wt.as_array(), e)
+
+
+def test_chain_downsample_factor():
+    """ test downsample factor validation """
+    c = chain.Chain(_cycles())
+    assert c.downsample(1) is c
+    with pytest.raises(ValueError):
+        c.downsample(0)
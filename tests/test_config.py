@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Copyright 2019 Harvey Ormston
+
+This file is part of osc_gen.
+
+    osc_gen is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    osc_gen is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with osc_gen.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import numpy as np
+import pytest
+
+from osc_gen import config, dsp, sig, wavetable
+
+
+def test_use_dtype():
+    """ test the library-wide dtype is set within a block and restored """
+    default = config.get_dtype()
+    assert default == np.float64
+    assert sig.SigGen(num_points=16).saw().dtype == np.float32
+    assert sig.SigGen(num_points=16).sin().dtype == np.float64
+    with config.use_dtype(np.float32):
+        assert config.get_dtype() == np.float32
+        assert sig.SigGen(num_points=16).sin().dtype == np.float32
+    assert config.get_dtype() == default
+    with config.use_dtype(np.float64):
+        assert sig.SigGen(num_points=16).saw().dtype == np.float64
+    assert config.DTYPE is None
+
+
+def test_dtype_override():
+    """ test per-call dtypes override the library-wide dtype """
+    assert config.get_dtype('float32') == np.float32
+    assert sig.SigGen(num_points=16, dtype=np.float32).tri().dtype == np.float32
+    assert dsp.additive(np.ones(4), 16, dtype=np.float32).dtype == np.float32
+    wt = wavetable.WaveTable(2, wave_len=16, contiguous=True, dtype=np.float32)
+    wt.waves = [sig.SigGen(num_points=8).saw()]
+    assert wt.as_array().dtype == np.float32
+
+
+def test_dtype_no_upcast():
+    """ test single precision is kept through generation and processing """
+    sgen = sig.SigGen(num_points=64, dtype=np.float32)
+    for wave in (sgen.saw(), sgen.sin(), sgen.noise(), sgen.arb(range(10)),
+                 sgen.sin_batch(harmonic=[0, 1, 2]),
+                 dsp.slew(sgen.sqr(), 0.5), dsp.mix(sgen.sin(), sgen.saw()),
+                 dsp.resynthesize(np.tile(sgen.sin(), 16), sgen)):
+        assert wave.dtype == np.float32
+
+
+def test_invalid_dtype():
+    """ test non floating point dtypes are rejected """
+    with pytest.raises(ValueError):
+        config.set_dtype(np.int16)
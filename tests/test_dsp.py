@@ -21,6 +21,7 @@ This file is part of osc_gen.
 from __future__ import division
 
 import numpy as np
+import pytest
 
 from osc_gen import dsp
 from osc_gen import sig
@@ -142,6 +143,89 @@ def test_slew():
     assert o[0] > o[1]
 
 
+def test_slew_batch():
+    """ test slew on a batch of cycles """
+    a = np.ones(100)
+    a[:50] *= -1
+    b = np.stack((a, -a))
+    o = dsp.slew(b, 0.1)
+    assert np.allclose(o[0], dsp.slew(a, 0.1))
+    assert np.allclose(o[1], dsp.slew(-a, 0.1))
+
+
+def test_one_pole():
+    """ test one_pole against a direct evaluation of the recursion """
+    a = np.random.uniform(-1, 1, 100)
+    e = np.empty_like(a)
+    prev = 0.5
+    for i, val in enumerate(a):
+        prev = 0.25 * val + 0.75 * prev
+        e[i] = prev
+    assert np.allclose(dsp.one_pole(a, 0.25, 0.75, init=0.5), e)
+
+
+def test_one_pole_numpy(monkeypatch):
+    """ test one_pole without scipy """
+    a = np.random.uniform(-1, 1, (3, 100))
+    e = dsp.one_pole(a, 0.25, 0.75, init=[0.0, 0.5, 1.0])
+    monkeypatch.setattr(dsp, 'HAS_SCIPY', False)
+    o = dsp.one_pole(a, 0.25, 0.75, init=[0.0, 0.5, 1.0])
+    assert np.allclose(o, e)
+
+
+@pytest.mark.parametrize('func, args', [
+    (dsp.normalize, ()),
+    (dsp.clip, (1.5, 0.1)),
+    (dsp.tube, (2, 0.1)),
+    (dsp.fold, (1.2, 0.2)),
+    (dsp.shape, (0.6, 0.1, 3)),
+    (dsp.slew, (0.3,)),
+    (dsp.downsample, (3,)),
+    (dsp.quantize, (5,)),
+    (dsp.band_limit, (8,)),
+])
+def test_out(func, args):
+    """ test writing results to an out array """
+    a = np.random.RandomState(0).uniform(-0.5, 0.7, (4, 64))
+    e = func(a.copy(), *args)
+
+    # the input is unchanged
+    b = a.copy()
+    out = np.empty_like(a)
+    o = func(b, *args, out=out)
+    assert o is out
+    assert np.array_equal(b, a)
+    assert np.allclose(o, e)
+
+    # the input is overwritten
+    o = func(b, *args, out=b)
+    assert o is b
+    assert np.allclose(o, e)
+
+
+def test_out_no_allocation():
+    """ test repeated calls reuse scratch arrays """
+    a = np.random.RandomState(0).uniform(-1, 1, (4, 64))
+    out = np.empty_like(a)
+    allocations = []
+    for _ in range(3):
+        dsp.shape(a, 0.5, out=out)
+        dsp.quantize(out, 4, out=out)
+        dsp.mix(out, a, 0.5, out=out)
+        allocations.append(dsp.SCRATCH.allocations)
+    assert allocations[1] == allocations[2]
+
+
+def test_mix_out():
+    """ test mix into one of its inputs """
+    a = np.linspace(-1, 1, 16)
+    b = np.sin(np.linspace(0, 2 * np.pi, 16))
+    e = dsp.mix(a, b, 0.25)
+    o = dsp.mix(a, b, 0.25, out=b)
+    assert o is b
+    assert np.allclose(o, e)
+
+
 def test_downsample():
     """ test downsample """
     a = np.linspace(-1, 1, 10)
@@ -164,6 +248,30 @@ def test_quantize():
     assert a[-2] == 2 / 3
 
 
+def test_fold_large():
+    """ test fold with an input which must be folded many times """
+    a = np.array([-0.9, -0.2, 0.3, 0.8])
+    o = dsp.fold(a.copy(), 10)
+    e = a * 11
+    while np.amax(np.abs(e)) > 1:
+        e[e > 1] = 2 - e[e > 1]
+        e[e < -1] = -2 - e[e < -1]
+    dsp.normalize(e)
+    assert np.allclose(o, e)
+
+
+def test_shapers_batch():
+    """ test waveshapers process each row of a batch independently """
+    a = np.sin(2 * np.pi * np.linspace(0, 1, 64))
+    b = np.stack((a, 0.5 * a + 0.1))
+    for func, args in ((dsp.clip, (1,)), (dsp.tube, (2,)), (dsp.fold, (2,)),
+                       (dsp.shape, ()), (dsp.downsample, (4,)),
+                       (dsp.quantize, (3,))):
+        o = func(b.copy(), *args)
+        assert np.allclose(o[0], func(b[0].copy(), *args))
+        assert np.allclose(o[1], func(b[1].copy(), *args))
+
+
 def test_fundamental():
     """ test fundamental """
     a = np.array([-1.0, 0.0, 1.0, 0.0])
@@ -185,6 +293,18 @@ def test_harmonic_series():
     assert np.allclose(h, e, rtol=5e-3, atol=5e-3)
 
 
+def test_harmonic_series_batch():
+    """ test harmonic_series on a batch of signals """
+    t = np.arange(3000) / 44100.
+    a = np.stack((np.sin(2 * np.pi * 110 * t),
+                  np.sign(np.sin(2 * np.pi * 220 * t))))
+    h = dsp.harmonic_series(a)
+    for row, inp in zip(h, a):
+        e = dsp.harmonic_series(inp)
+        assert np.allclose(row[:e.size], e)
+        assert np.all(row[e.size:] == 0)
+
+
 def test_slice_cycles():
     """ test slice_cycles """
     a = np.array([0.0, 1.0, 0.0, -1.0])
@@ -194,6 +314,57 @@ def test_slice_cycles():
     assert np.all(o[1] == e)
 
 
+def test_slice_cycles_stream():
+    """ test slice_cycles_stream """
+    a = np.array([0.0, 1.0, 0.0, -1.0])
+    e = a
+    a = np.tile(a, 501)
+    o = dsp.slice_cycles_stream(lambda start, num: a[start:start + num],
+                                a.size, 2, 2)
+    assert len(o) == 2
+    assert np.all(o[1] == e)
+
+
+def test_slice_cycles_short():
+    """ test slice_cycles falls back to fundamental for very short signals """
+    a = np.array([0.0, 1.0, 0.0, -1.0, 0.0])
+    e = np.array([1.0, 0.0, -1.0, 0.0])
+    o = dsp.slice_cycles(a, 2, 4)
+    assert len(o) == 1
+    assert np.all(o[0] == e)
+
+
+def test_slice_cycles_fractional():
+    """ test slice_cycles with fractional cycle boundaries """
+    fs = 44100
+    freq = 441.3
+    a = np.sin(2 * np.pi * freq * np.arange(fs) / fs)
+    o = dsp.slice_cycles(a, 8, fs, fractional=True)
+    assert len(o) == 8
+    for cycle in o:
+        assert cycle.size == int(fs / freq)
+        assert abs(cycle[0]) < 1e-3
+        # the sample after the last one wraps to the start of the cycle
+        assert abs(cycle[-1] - np.sin(-2 * np.pi / cycle.size)) < 1e-3
+
+
+def test_slice_cycles_drift():
+    """ test slice_cycles follows a change in pitch """
+    fs = 44100
+    a = np.concatenate((np.sin(2 * np.pi * 441 * np.arange(fs) / fs),
+                        np.sin(2 * np.pi * 882 * np.arange(fs) / fs)))
+    o = dsp.slice_cycles(a, 4, fs)
+    assert np.allclose([c.size for c in o], [100, 100, 50, 50], atol=1)
+
+
+def test_nearest():
+    """ test the nearest value lookup used by slice_cycles """
+    arr = np.array([2, 6, 10])
+    vals = np.array([0, 4, 5, 8, 12])
+    o = dsp._nearest(arr, vals)
+    assert np.all(o == [2, 2, 6, 6, 10])
+
+
 def test_resynthesize():
     """ test resynthesize """
     a = np.sin(128 * np.pi * np.linspace(0, 1, 2048))
@@ -202,3 +373,16 @@ def test_resynthesize():
     s.num_points = 32
     o = dsp.resynthesize(a, s)
     assert np.all(np.abs(o - e) < 0.01)
+
+
+def test_resynthesize_batch():
+    """ test resynthesize on a batch of signals """
+    t = np.linspace(0, 1, 4096)
+    a = np.stack((np.sin(128 * np.pi * t),
+                  np.sin(128 * np.pi * t) + 0.5 * np.sin(256 * np.pi * t)))
+    s = sig.SigGen()
+    s.num_points = 64
+    o = dsp.resynthesize(a, s)
+    assert o.shape == (2, 64)
+    assert np.allclose(o[0], dsp.resynthesize(a[0], s))
+    assert np.allclose(o[1], dsp.resynthesize(a[1], s))
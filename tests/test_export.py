@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Copyright 2019 Harvey Ormston
+
+This file is part of osc_gen.
+
+    osc_gen is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    osc_gen is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with osc_gen.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import pytest
+import numpy as np
+
+from osc_gen import export
+from osc_gen import instrument
+from osc_gen import sig
+from osc_gen import wavetable
+from osc_gen import wavfile
+from osc_gen import wtfile
+
+
+@pytest.fixture(name='table')
+def fixture_table():
+    """ a wavetable which stores waves of a different length to wave_len """
+    sgen = sig.SigGen(num_points=100)
+    return wavetable.WaveTable(3, waves=[sgen.saw(), sgen.sin()], wave_len=64)
+
+
+@pytest.mark.parametrize('threads', [None, 3])
+def test_export(tmp_path, table, threads):
+    """ test each file matches its single format writer """
+    names = ['t.wav', 't24.wav', 't.h2p', 't.oscw']
+    targets = [str(tmp_path / name) for name in names]
+    targets[1] = (targets[1], 'wav24')
+    written = table.export(targets, samplerate=48000, threads=threads)
+    assert written == [str(tmp_path / name) for name in names]
+
+    table.to_wav(str(tmp_path / 'ref.wav'))
+    table.to_wav(str(tmp_path / 'ref24.wav'), sample_format='PCM_24')
+    table.to_h2p(str(tmp_path / 'ref.h2p'))
+    with open(str(tmp_path / 't.h2p')) as out_file, \
+            open(str(tmp_path / 'ref.h2p')) as ref_file:
+        assert out_file.read() == ref_file.read()
+    for name, ref in [('t.wav', 'ref.wav'), ('t24.wav', 'ref24.wav')]:
+        data, fs = wavfile.read(str(tmp_path / name), with_sample_rate=True)
+        assert fs == 48000
+        assert np.all(data == wavfile.read(str(tmp_path / ref)))
+    assert np.all(wtfile.read(str(tmp_path / 't.oscw')) == table.as_array())
+
+
+def test_materialized_once(tmp_path, table):
+    """ test the waves are materialized once for all formats """
+    with instrument.recording() as rec:
+        table.export([str(tmp_path / 't.wav'), str(tmp_path / 't.h2p')])
+    assert rec.summary()['SigGen.arb_batch']['calls'] == 1
+
+
+def test_register(tmp_path, table):
+    """ test custom writers and unknown formats """
+    calls = []
+
+    @export.register('test', '.test')
+    def write_test(waves, filename, samplerate):  # pylint: disable=unused-variable
+        calls.append((waves.shape, filename, samplerate))
+
+    try:
+        export.export(table, [str(tmp_path / 't.test')], samplerate=8000)
+        assert calls == [((3, 64), str(tmp_path / 't.test'), 8000)]
+        with pytest.raises(ValueError):
+            export.export(table, [str(tmp_path / 't.wav'),
+                                  str(tmp_path / 't.xyz')])
+        assert not (tmp_path / 't.wav').exists()
+        with pytest.raises(ValueError):
+            export.export(table, [(str(tmp_path / 't.wav'), 'mp3')])
+    finally:
+        del export.WRITERS['test']
+        del export.EXTENSIONS['.test']
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Copyright 2019 Harvey Ormston
+
+This file is part of osc_gen.
+
+    osc_gen is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    osc_gen is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with osc_gen.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from __future__ import division
+
+import json
+
+import numpy as np
+
+from osc_gen import instrument
+from osc_gen import sig
+from osc_gen import wavetable
+from osc_gen import wavfile
+
+
+def test_recording(tmp_path):
+    """ test stages are recorded while recording """
+    filename = str(tmp_path / 'in.wav')
+    wavfile.write(np.tile(sig.SigGen(num_points=100).saw(), 200), filename)
+
+    with instrument.recording() as rec:
+        wavetable.WaveTable(4, wave_len=64).from_wav(filename).to_wav(
+            str(tmp_path / 'out.wav'))
+
+    summary = rec.summary()
+    for name in ('wavfile.read', 'pitch.detect', 'dsp.slice_cycles',
+                 'SigGen.arb_batch', 'wavfile.encode', 'WaveTable.from_wav'):
+        assert summary[name]['calls'] > 0
+    assert summary['wavfile.encode']['bytes'] > 0
+    assert not instrument.ENABLED
+
+
+def test_disabled():
+    """ test nothing is recorded outside of a recording """
+    events = []
+    with instrument.recording() as rec:
+        pass
+    sig.SigGen().arb(np.zeros(10))
+    assert not rec.events
+    instrument.add_callback(events.append)
+    sig.SigGen().arb(np.zeros(10))
+    instrument.remove_callback(events.append)
+    sig.SigGen().arb(np.zeros(10))
+    assert [e['name'] for e in events] == ['SigGen.arb']
+
+
+def test_export(tmp_path):
+    """ test exporting to JSON and Chrome trace files """
+    with instrument.recording() as rec:
+        with instrument.span('test.block', nbytes=8):
+            sig.morph([np.zeros(4), np.ones(4)], 4)
+    rec.to_json(str(tmp_path / 'rec.json'))
+    rec.to_chrome_trace(str(tmp_path / 'trace.json'))
+    with open(str(tmp_path / 'rec.json')) as in_file:
+        assert json.load(in_file)['summary']['test.block']['bytes'] == 8
+    with open(str(tmp_path / 'trace.json')) as in_file:
+        names = [e['name'] for e in json.load(in_file)['traceEvents']]
+    assert sorted(names) == ['sig.morph', 'test.block']
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Copyright 2019 Harvey Ormston
+
+This file is part of osc_gen.
+
+    osc_gen is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    osc_gen is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with osc_gen.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from __future__ import division
+
+import numpy as np
+
+from osc_gen import pitch
+
+
+def _glide(fs, seconds, freq, depth=0.):
+    """ make a signal with a weak fundamental and a slowly drifting pitch """
+    t = np.arange(int(fs * seconds)) / fs
+    f = freq * (1 + depth * np.sin(2 * np.pi * 0.2 * t))
+    phase = 2 * np.pi * np.cumsum(f) / fs
+    sig = (0.2 * np.sin(phase) + np.sin(2 * phase) + 0.8 * np.sin(3 * phase))
+    return t, f, sig
+
+
+def test_detect():
+    """ test detect finds the fundamental rather than a strong harmonic """
+    _, _, a = _glide(44100, 2, 110)
+    f0, times, freqs = pitch.detect(a, 44100)
+    assert abs(f0 - 110) < 0.05
+    assert times.shape == freqs.shape
+    assert np.all(np.abs(freqs - 110) < 0.05)
+
+
+def test_detect_exact():
+    """ test detect on a signal with a whole number period """
+    a = np.tile(np.array([0.0, 1.0, 0.0, -1.0]), 501)
+    assert pitch.detect(a, 2)[0] == 0.5
+
+
+def test_track():
+    """ test track follows pitch drift """
+    t, f, a = _glide(44100, 10, 110, depth=0.05)
+    times, freqs = pitch.track(a, 44100, max_frames=64)
+    assert times.size <= 64
+    assert np.all(np.abs(freqs - np.interp(times, t, f)) < 0.1)
+
+
+def test_track_noise():
+    """ test frames of noise are not periodic """
+    a = np.random.RandomState(0).randn(8192)
+    _, freqs = pitch.track(a, 44100)
+    assert np.all(np.isnan(freqs))
+
+
+def test_frames():
+    """ test frames is a view of the input """
+    a = np.arange(10.)
+    o = pitch.frames(a, 4, 3)
+    assert np.shares_memory(a, o)
+    assert np.all(o == [[0, 1, 2, 3], [3, 4, 5, 6], [6, 7, 8, 9]])
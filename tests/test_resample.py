@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Copyright 2019 Harvey Ormston
+
+This file is part of osc_gen.
+
+    osc_gen is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    osc_gen is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with osc_gen.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from __future__ import division
+import pytest
+import numpy as np
+
+from osc_gen import resample
+
+
+def _cycle(num_points):
+    """ a band-limited periodic cycle """
+
+    phase = 2 * np.pi * np.arange(num_points) / num_points
+    return np.sin(3 * phase) + 0.5 * np.cos(5 * phase)
+
+
+@pytest.mark.parametrize('src_len, dst_len', [(64, 128), (128, 64),
+                                              (100, 37), (37, 100)])
+def test_fft(src_len, dst_len):
+    """ test fft resampling is exact for band-limited cycles """
+
+    res = resample.fft(np.array([_cycle(src_len)] * 3), dst_len)
+    assert res.shape == (3, dst_len)
+    assert np.allclose(res, _cycle(dst_len))
+
+
+def test_fft_nyquist():
+    """ test harmonics at the Nyquist frequency are kept """
+
+    nyquist = np.cos(np.pi * np.arange(8))
+    assert np.allclose(resample.fft(nyquist, 16),
+                       np.cos(np.pi * np.arange(16) / 2))
+    assert np.allclose(resample.fft(resample.fft(nyquist, 16), 8), nyquist)
+
+
+def test_linear():
+    """ test linear resampling matches np.interp """
+
+    data = np.random.uniform(-1, 1, (4, 50))
+    exp = [np.interp(np.linspace(0, 50, 77), np.linspace(0, 50, 50), x)
+           for x in data]
+    out = np.empty((4, 77))
+    assert resample.resample(data, 77, out=out) is out
+    assert np.allclose(out, exp)
+
+
+def test_plan_cache():
+    """ test plans are reused and methods are checked """
+
+    resample.PLANS.clear()
+    resample.linear(np.zeros(10), 20)
+    resample.linear(np.ones((2, 10)), 20)
+    resample.fft(np.zeros(10), 20)
+    assert len(resample.PLANS) == 2
+    with pytest.raises(ValueError):
+        resample.resample(np.zeros(10), 20, method='cubic')
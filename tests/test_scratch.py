@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Copyright 2019 Harvey Ormston
+
+This file is part of osc_gen.
+
+    osc_gen is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    osc_gen is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with osc_gen.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import numpy as np
+
+from osc_gen import scratch
+
+
+def test_pool_reuse():
+    """ test arrays returned to the pool are reused """
+    pool = scratch.BufferPool()
+    a = pool.get((2, 8), np.float32)
+    pool.put(a)
+    assert pool.get((2, 8), np.float32) is a
+    assert pool.get((2, 8), np.float64) is not a
+    assert pool.info()['allocations'] == 2
+    assert pool.info()['reuses'] == 1
+
+
+def test_pool_borrow():
+    """ test borrowed arrays are returned at the end of the block """
+    pool = scratch.BufferPool()
+    with pool.borrow(4) as a:
+        assert a.shape == (4,)
+        assert len(pool) == 0
+        with pool.borrow(4) as b:
+            assert b is not a
+    assert len(pool) == 2
+
+
+def test_pool_maxsize():
+    """ test the least recently returned arrays are discarded """
+    pool = scratch.BufferPool(maxsize=2)
+    a, b, c = [pool.get(n) for n in (1, 2, 3)]
+    pool.put(a, b, c)
+    assert len(pool) == 2
+    assert pool.get(1) is not a
+    assert pool.get(3) is c
+
+
+def test_pool_max_bytes():
+    """ test the pool is bounded by the total size of its arrays """
+    pool = scratch.BufferPool(max_bytes=80)
+    a, b = [pool.get(4, np.float64) for _ in range(2)]
+    c = pool.get(5, np.float64)
+    pool.put(a, b, c)
+    assert len(pool) == 2
+    assert pool.info()['nbytes'] == 72
+    assert pool.get(4, np.float64) is b
+    big = pool.get(11, np.float64)
+    pool.put(big)
+    assert pool.get(11, np.float64) is not big
+    assert pool.info()['nbytes'] == 40
@@ -137,3 +137,110 @@ def test_morph(fxsg):  # pylint: disable=redefined-outer-name
     inp = [saw, tri]
     exp = [saw, (saw + tri) / 2, tri]
     assert all(all(sig.morph(inp, 3)[i] == exp[i]) for i in range(3))
+
+
+def test_noise_batch(fxsg):  # pylint: disable=redefined-outer-name
+    """ test noise batch generation """
+
+    fxsg.num_points = 64
+    for character in (0.2, 0.5, 0.8):
+        noise = fxsg.noise(seed=1, character=character, num=4)
+        assert noise.shape == (4, 64)
+        assert np.allclose(np.amax(noise, axis=1), 1)
+        assert np.allclose(np.amin(noise, axis=1), -1)
+
+
+def test_morph_many(fxsg):  # pylint: disable=redefined-outer-name
+    """ test morph between more than two waves """
+
+    fxsg.num_points = 8
+    inp = [fxsg.saw(), fxsg.sqr(), fxsg.tri()]
+    out = sig.morph(inp, 5)
+    assert out.shape == (5, 8)
+    assert np.allclose(out[0], inp[0])
+    assert np.allclose(out[1], inp[1])
+    assert np.allclose(out[2], (2 * inp[1] + inp[2]) / 3)
+    assert np.allclose(out[4], inp[2])
+
+
+def test_morph_out(fxsg):  # pylint: disable=redefined-outer-name
+    """ test morph into a preallocated buffer """
+
+    fxsg.num_points = 8
+    inp = [fxsg.saw(), fxsg.tri()]
+    buf = np.zeros((4, 8), dtype=np.float32)
+    out = sig.morph(inp, 4, out=buf)
+    assert out is buf
+    assert np.allclose(buf, sig.morph(inp, 4))
+
+    # the input may be part of the output buffer
+    buf[:2] = inp
+    sig.morph(buf[:2], 4, out=buf)
+    assert np.allclose(buf, sig.morph(inp, 4))
+
+
+def test_base_cache():
+    """ test base cycles are cached and read-only """
+
+    sig.RAMP_CACHE.clear()
+    sgen = sig.SigGen(num_points=16, harmonic=1)
+    sgen.saw()
+    sgen.sqr()
+    sgen.pls(0.5)
+    info = sig.RAMP_CACHE.info()
+    assert info['misses'] == 1
+    assert info['hits'] == 2
+
+    base = sgen._base  # pylint: disable=protected-access
+    with pytest.raises(ValueError):
+        base[0] = 0
+    assert np.all(sgen.saw() == sig.SigGen(num_points=16, harmonic=1).saw())
+
+
+def test_batch():
+    """ test batch generation matches single cycle generation """
+
+    harmonics = np.array([0, 1, 2])
+    phases = np.array([0.0, 0.5, 1.0])
+    widths = np.array([-0.5, 0.0, 0.5])
+    sgen = sig.SigGen(num_points=32)
+    batches = {
+        'saw': sgen.saw_batch(harmonics, phases),
+        'tri': sgen.tri_batch(harmonics, phases),
+        'sqr': sgen.sqr_batch(harmonics, phases),
+        'sin': sgen.sin_batch(harmonics, phases),
+        'exp_saw': sgen.exp_saw_batch(harmonics, harmonics, phases),
+        'exp_sin': sgen.exp_sin_batch(harmonics, harmonics, phases),
+        'pls': sgen.pls_batch(widths, harmonics, phases),
+    }
+    args = {'exp_saw': harmonics, 'exp_sin': harmonics, 'pls': widths}
+
+    for name, batch in batches.items():
+        assert batch.shape == (3, 32)
+        for i, (harmonic, phase) in enumerate(zip(harmonics, phases)):
+            single = sig.SigGen(num_points=32, harmonic=harmonic, phase=phase)
+            method = getattr(single, name)
+            exp = method(args[name][i]) if name in args else method()
+            assert np.allclose(batch[i], exp)
+
+
+def test_batch_broadcast(fxsg):  # pylint: disable=redefined-outer-name
+    """ test batch parameters are broadcast against each other """
+
+    fxsg.num_points = 16
+    batch = fxsg.sin_batch(harmonic=[0, 1, 2, 3], amp=0.5)
+    assert batch.shape == (4, 16)
+    assert np.allclose(np.amax(batch, axis=1), 0.5, atol=0.05)
+
+
+def test_arb_batch():
+    """ test cycles are resampled together as by arb """
+
+    sgen = sig.SigGen(num_points=32)
+    cycles = [np.sin(np.linspace(0, 2 * np.pi, num)) for num in (10, 20, 10, 32)]
+    batch = sgen.arb_batch(cycles)
+    assert batch.shape == (4, 32)
+    for wave, cycle in zip(batch, cycles):
+        assert np.allclose(wave, sgen.arb(cycle), atol=1e-6)
+    sgen.method = 'fft'
+    assert np.allclose(sgen.arb(sgen.sin()[::2]), sgen.sin(), atol=1e-5)
@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+Copyright 2019 Harvey Ormston
+
+This file is part of osc_gen.
+
+    osc_gen is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    osc_gen is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with osc_gen.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from __future__ import division
+
+import numpy as np
+
+from osc_gen import cache
+from osc_gen import sig
+from osc_gen import wavetable
+from osc_gen import wavfile
+
+
+def test_contiguous_waves():
+    """ test contiguous wavetable stores waves in a single buffer """
+    sg = sig.SigGen(num_points=16)
+    wt = wavetable.WaveTable(4, waves=[sg.saw(), sg.sqr()], contiguous=True)
+    arr = wt.as_array()
+    assert arr.shape == (4, 16)
+    assert arr.dtype == np.float32
+    assert wt.waves.shape == (2, 16)
+    assert np.allclose(wt.get_wave_at_index(1), sg.sqr())
+    assert np.all(wt.get_wave_at_index(3) == 0)
+
+
+def test_contiguous_views():
+    """ test contiguous wavetable slots are views into the buffer """
+    sg = sig.SigGen(num_points=16)
+    wt = wavetable.WaveTable(2, waves=[sg.saw(), sg.sqr()], contiguous=True)
+    assert np.shares_memory(wt.get_wave_at_index(0), wt.as_array())
+    assert all(np.shares_memory(w, wt.as_array()) for w in wt.get_waves())
+
+
+def test_contiguous_resample():
+    """ test contiguous wavetable resamples waves to wave_len """
+    sg = sig.SigGen(num_points=16)
+    wt = wavetable.WaveTable(2, waves=[sg.sin()], wave_len=32,
+                             contiguous=True)
+    assert np.allclose(wt.get_wave_at_index(0),
+                       sig.SigGen(num_points=32).arb(sg.sin()))
+
+
+def test_contiguous_too_many():
+    """ test contiguous wavetable rejects more waves than slots """
+    sg = sig.SigGen(num_points=16)
+    wt = wavetable.WaveTable(1, contiguous=True)
+    try:
+        wt.waves = [sg.saw(), sg.sqr()]
+    except ValueError:
+        return
+    assert False
+
+
+def test_contiguous_morph_with():
+    """ test contiguous morph_with matches list morph_with """
+    sg = sig.SigGen(num_points=16)
+    waves_a = [sg.saw(), sg.sqr()]
+    waves_b = [sg.sin(), sg.tri()]
+    exp = wavetable.WaveTable(2, waves=waves_a).morph_with(
+        wavetable.WaveTable(2, waves=waves_b))
+    wt_a = wavetable.WaveTable(2, waves=waves_a, contiguous=True)
+    wt_b = wavetable.WaveTable(2, waves=waves_b, contiguous=True)
+    out = wt_a.morph_with(wt_b)
+    assert out.contiguous
+    assert np.allclose(out.as_array(), exp.as_array(), atol=1e-6)
+    wt_a.morph_with(wt_b, in_place=True)
+    assert np.allclose(wt_a.as_array(), exp.as_array(), atol=1e-6)
+
+
+def test_contiguous_morph_with_slots():
+    """ test contiguous morph_with tables with different numbers of slots """
+    sg = sig.SigGen(num_points=16)
+    waves = [sg.saw(), sg.sqr(), sg.sin(), sg.tri()]
+    for num_a, num_b in [(4, 2), (2, 4)]:
+        exp = wavetable.WaveTable(num_a, waves=waves[:num_a]).morph_with(
+            wavetable.WaveTable(num_b, waves=waves[::-1][:num_b]))
+        wt_a = wavetable.WaveTable(num_a, waves=waves[:num_a], contiguous=True)
+        wt_b = wavetable.WaveTable(num_b, waves=waves[::-1][:num_b],
+                                   contiguous=True)
+        out = wt_a.morph_with(wt_b)
+        assert out.as_array().shape == (num_a, 16)
+        assert np.allclose(out.as_array(), exp.as_array(), atol=1e-6)
+
+
+def test_contiguous_clear():
+    """ test clearing a contiguous wavetable """
+    sg = sig.SigGen(num_points=16)
+    wt = wavetable.WaveTable(2, waves=[sg.saw()], contiguous=True)
+    wt.clear()
+    assert len(wt.waves) == 0
+    assert np.all(wt.as_array() == 0)
+
+
+def test_mip_map():
+    """ test mip-map levels are band-limited """
+    sg = sig.SigGen(num_points=64)
+    wt = wavetable.WaveTable(2, waves=[sg.saw(), sg.sqr()], contiguous=True)
+    levels = wt.get_mip_maps(lru=None)
+    assert len(levels) == 6
+    assert np.allclose(levels[0].as_array(), wt.as_array(), atol=1e-5)
+    for octave, level in enumerate(levels):
+        spectrum = np.abs(np.fft.rfft(level.as_array(), axis=-1))
+        cutoff = 32 >> octave
+        assert np.all(spectrum[:, cutoff + 1:] < 1e-3)
+
+
+def test_mip_map_cache():
+    """ test mip-map levels are reused from the cache """
+    lru = cache.LRUCache()
+    sg = sig.SigGen(num_points=64)
+    wt = wavetable.WaveTable(2, waves=[sg.saw(), sg.saw()])
+    first = wt.get_mip_map(2, lru=lru)
+    assert lru.info()['misses'] == 2
+    second = wt.get_mip_map(2, lru=lru)
+    assert lru.info()['hits'] == 2
+    assert np.all(first.as_array() == second.as_array())
+
+
+def test_from_wav(tmp_path):
+    """ test populating a wavetable from a wav file """
+    filename = str(tmp_path / 'saw.wav')
+    sg = sig.SigGen(num_points=100)
+    wavfile.write(np.tile(sg.saw(), 200), filename)
+    for resynthesize in (False, True):
+        for streaming in (False, True):
+            wt = wavetable.WaveTable(4, wave_len=64).from_wav(
+                filename, resynthesize=resynthesize, streaming=streaming)
+            assert wt.as_array().shape == (4, 64)
+            assert np.allclose(np.amax(wt.as_array(), axis=1), 1)
+
+
+def test_from_wav_disk_cache(tmp_path):
+    """ test a cached wav import is memory-mapped """
+    filename = str(tmp_path / 'saw.wav')
+    sg = sig.SigGen(num_points=100)
+    wavfile.write(np.tile(sg.saw(), 200), filename)
+    disk = cache.DiskCache(str(tmp_path / 'cache'))
+    first = wavetable.WaveTable(4, wave_len=64, contiguous=True).from_wav(
+        filename, disk_cache=disk)
+    second = wavetable.WaveTable(4, wave_len=64, contiguous=True).from_wav(
+        filename, disk_cache=disk)
+    assert disk.info()['hits'] == 1
+    assert isinstance(second.as_array(), np.memmap)
+    assert np.all(first.as_array() == second.as_array())
+    wavetable.WaveTable(4, wave_len=64).from_wav(
+        filename, resynthesize=True, disk_cache=disk)
+    assert disk.info()['size'] == 2
+
+
+def test_from_cache(tmp_path):
+    """ test building a wavetable from a cached recipe """
+    disk = cache.DiskCache(str(tmp_path))
+    calls = []
+
+    def build():
+        calls.append(1)
+        sg = sig.SigGen(num_points=32)
+        return wavetable.WaveTable(2, waves=[sg.saw(), sg.sin()])
+
+    recipe = {'waves': ['saw', 'sin'], 'num_points': 32}
+    first = wavetable.WaveTable.from_cache(disk, recipe, build)
+    second = wavetable.WaveTable.from_cache(disk, recipe, build)
+    assert len(calls) == 1
+    assert second.num_slots == 2 and second.wave_len == 32
+    assert np.all(first.as_array() == second.as_array())
+
+
+def _check_mutable(table, other):
+    """ check a table with a read-only buffer can be modified """
+    exp = table.as_array().copy()
+    morphed = table.morph_with(other)
+    assert np.all(table.as_array() == exp)
+    table.morph_with(other, in_place=True)
+    assert np.allclose(table.as_array(), morphed.as_array())
+    table.chain().fold(2).apply()
+    table.waves = [other.get_wave_at_index(0)]
+    assert np.all(table.get_wave_at_index(0) == other.get_wave_at_index(0))
+    table.clear()
+    assert np.all(table.as_array() == 0)
+
+
+def test_from_cache_mutable(tmp_path):
+    """ test a wavetable from the cache can be modified """
+    disk = cache.DiskCache(str(tmp_path))
+    sg = sig.SigGen(num_points=32)
+    other = wavetable.WaveTable(2, waves=[sg.sqr(), sg.tri()])
+
+    def build():
+        return wavetable.WaveTable(2, waves=[sg.saw(), sg.sin()])
+
+    wavetable.WaveTable.from_cache(disk, 'saw_sin', build)
+    table = wavetable.WaveTable.from_cache(disk, 'saw_sin', build)
+    assert not table.as_array().flags.writeable
+    _check_mutable(table, other)
+    cached = wavetable.WaveTable.from_cache(disk, 'saw_sin', build)
+    assert np.all(cached.as_array() == build().as_array())
+
+
+def test_save_load(tmp_path):
+    """ test saving and memory-mapped loading of a wavetable """
+    sg = sig.SigGen(num_points=64, dtype=np.float64)
+    wt = wavetable.WaveTable(3, waves=[sg.saw(), sg.sin(), sg.sqr()],
+                             dtype=np.float64)
+    filename = str(tmp_path / 'table.oscw')
+    wt.save(filename, metadata={'waves': ['saw', 'sin', 'sqr']})
+    loaded = wavetable.WaveTable.load(filename)
+    assert isinstance(loaded.as_array(), np.memmap)
+    assert loaded.dtype == np.float64
+    assert np.all(loaded.as_array() == wt.as_array())
+    copy = wavetable.WaveTable.load(filename, mmap=False)
+    assert copy.as_array().flags.writeable
+    assert np.all(copy.as_array() == wt.as_array())
+
+
+def test_load_mutable(tmp_path):
+    """ test a memory-mapped wavetable can be modified without changing the
+    file """
+    sg = sig.SigGen(num_points=32)
+    filename = str(tmp_path / 'table.oscw')
+    wavetable.WaveTable(2, waves=[sg.saw(), sg.sin()]).save(filename)
+    table = wavetable.WaveTable.load(filename)
+    _check_mutable(table, wavetable.WaveTable(2, waves=[sg.sqr(), sg.tri()]))
+    assert np.all(wavetable.WaveTable.load(filename).as_array() ==
+                  np.array([sg.saw(), sg.sin()]))
+
+
+def test_from_harmonics():
+    """ test populating a wavetable by additive synthesis """
+    mags = np.zeros((2, 8))
+    mags[0, 0] = 1
+    mags[1, [0, 2]] = [1, 0.5]
+    wt = wavetable.WaveTable(2, wave_len=32).from_harmonics(
+        magnitudes=mags, phases=np.pi / 2)
+    t = np.arange(32) / 32
+    assert np.allclose(wt.get_wave_at_index(0), np.cos(2 * np.pi * t), atol=1e-6)
+    exp = np.cos(2 * np.pi * t) + 0.5 * np.cos(6 * np.pi * t)
+    exp /= np.amax(np.abs(exp))
+    assert np.allclose(wt.get_wave_at_index(1), exp, atol=1e-6)
+
+    limited = wavetable.WaveTable(2, wave_len=32).from_harmonics(
+        harmonics=mags * 1j, max_harmonic=2)
+    assert np.allclose(limited.get_wave_at_index(1), np.cos(2 * np.pi * t),
+                       atol=1e-6)
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Copyright 2019 Harvey Ormston
+
+This file is part of osc_gen.
+
+    osc_gen is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    osc_gen is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with osc_gen.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from __future__ import division
+
+import wave
+
+import numpy as np
+import pytest
+
+from osc_gen import wavfile
+
+
+@pytest.fixture
+def fxwav(tmp_path):
+    """ wav file fixture """
+    filename = str(tmp_path / 'sine.wav')
+    t = np.arange(20000) / 44100.
+    wavfile.write(0.5 * np.sin(2 * np.pi * 220 * t) + 0.1, filename)
+    return filename
+
+
+def test_stream_reader(fxwav):  # pylint: disable=redefined-outer-name
+    """ test streamed reading matches reading the whole file """
+    data = wavfile.read(fxwav)
+    with wavfile.StreamReader(fxwav, chunk_size=1000) as reader:
+        assert reader.frames == data.size
+        assert reader.samplerate == 44100
+        assert np.allclose(reader.read(1234, 500), data[1234:1734])
+        assert np.allclose(reader.read(0, reader.frames), data)
+
+
+def test_stream_reader_wave(fxwav, monkeypatch):  # pylint: disable=redefined-outer-name
+    """ test streamed reading without soundfile """
+    data = wavfile.read(fxwav)
+    monkeypatch.setattr(wavfile, 'HAS_SOUNDFILE', False)
+    with wavfile.StreamReader(fxwav, chunk_size=1000) as reader:
+        assert np.allclose(reader.read(1234, 500), data[1234:1734])
+
+
+@pytest.mark.parametrize('subtype', ['PCM_16', 'PCM_24', 'PCM_32', 'FLOAT'])
+def test_read_memmap(tmp_path, monkeypatch, subtype):
+    """ test reading without soundfile matches reading with soundfile """
+    sf = pytest.importorskip('soundfile')
+    filename = str(tmp_path / 'multi.wav')
+    sf.write(filename, np.random.uniform(-0.9, 0.9, (1000, 2)), 48000,
+             subtype=subtype)
+    exp = [wavfile.read(filename, channel=c) for c in (0, 1)]
+    monkeypatch.setattr(wavfile, 'HAS_SOUNDFILE', False)
+    for channel in (0, 1):
+        data, fs = wavfile.read(filename, with_sample_rate=True,
+                                channel=channel)
+        assert fs == 48000
+        assert np.allclose(data, exp[channel])
+
+
+def test_memmap(fxwav):  # pylint: disable=redefined-outer-name
+    """ test memmap does not copy the sample data """
+    samples, fs = wavfile.memmap(fxwav)
+    assert fs == 44100
+    assert samples.shape == (20000, 1)
+    assert isinstance(samples, np.memmap)
+    assert samples.dtype == np.int16
+
+
+@pytest.mark.parametrize('sample_format', ['PCM_16', 'PCM_24', 'FLOAT'])
+def test_write_formats(tmp_path, sample_format):
+    """ test writing each sample format """
+    filename = str(tmp_path / 'out.wav')
+    data = np.linspace(-1, 1, 101)
+    wavfile.write(data, filename, 48000, sample_format=sample_format)
+    samples, fs = wavfile.memmap(filename)
+    bits = wavfile.SAMPLE_FORMATS[sample_format][1]
+    assert fs == 48000
+    assert np.allclose(wavfile.to_float(samples[:, 0], bits=bits), data,
+                       atol=1e-4)
+
+
+@pytest.mark.parametrize('channels', [1, 3])
+def test_stream_reader_pcm_u8(tmp_path, monkeypatch, channels):
+    """ test 3 frame slices of 8 bit files are not decoded as 24 bit """
+    filename = str(tmp_path / 'u8.wav')
+    samples = np.repeat(np.arange(0, 256, 16, dtype=np.uint8), channels)
+    wav_file = wave.open(filename, 'wb')
+    wav_file.setnchannels(channels)
+    wav_file.setsampwidth(1)
+    wav_file.setframerate(8000)
+    wav_file.writeframes(samples.tobytes())
+    wav_file.close()
+    monkeypatch.setattr(wavfile, 'HAS_SOUNDFILE', False)
+    exp = (np.arange(0, 256, 16) - 128) / 128.
+    with wavfile.StreamReader(filename) as reader:
+        data = reader.read_raw(4, 3)
+    assert data.shape == (3,)
+    assert np.array_equal(data, exp[4:7])
+    data, fs = wavfile.read(filename, with_sample_rate=True)
+    assert fs == 8000
+    assert data.shape == (16,)
+
+
+def test_encode_16():
+    """ test 16 bit encoding truncates and clips """
+    data = np.array([-2.0, -1.0, -0.5, 0.0, 0.5, 1.0, 2.0])
+    exp = np.array([-32768, -32768, -16384, 0, 16384, 32767, 32767])
+    assert wavfile.encode(data) == exp.astype('<i2').tobytes()
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Copyright 2019 Harvey Ormston
+
+This file is part of osc_gen.
+
+    osc_gen is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    osc_gen is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with osc_gen.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import pytest
+import numpy as np
+
+from osc_gen import wtfile
+
+
+def test_round_trip(tmp_path):
+    """ test waves, header and metadata are stored """
+    filename = str(tmp_path / 'table.oscw')
+    waves = np.random.uniform(-1, 1, (4, 100)).astype(np.float32)
+    wtfile.write(waves, filename, samplerate=48000,
+                 metadata={'sig': 'saw', 'fold': [0.5, 1.0]})
+    info = wtfile.read_info(filename)
+    assert info == {'num_slots': 4, 'wave_len': 100, 'samplerate': 48000,
+                    'dtype': np.dtype('<f4'),
+                    'metadata': {'sig': 'saw', 'fold': [0.5, 1.0]}}
+    read = wtfile.read(filename)
+    assert not read.flags.writeable
+    assert np.all(read == waves)
+    assert np.all(wtfile.read(filename, mmap=False) == waves)
+
+
+def test_invalid(tmp_path):
+    """ test invalid files and waves are rejected """
+    filename = str(tmp_path / 'table.oscw')
+    with open(filename, 'wb') as out_file:
+        out_file.write(b'RIFF0000WAVE')
+    with pytest.raises(ValueError):
+        wtfile.read(filename)
+    with pytest.raises(ValueError):
+        wtfile.write(np.zeros(10), filename)
+    with pytest.raises(ValueError):
+        wtfile.write(np.zeros((2, 10), dtype=int), filename)
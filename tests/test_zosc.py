@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Copyright 2019 Harvey Ormston
+
+This file is part of osc_gen.
+
+    osc_gen is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    osc_gen is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with osc_gen.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from __future__ import division
+
+import numpy as np
+
+from osc_gen import sig
+from osc_gen import wavetable
+from osc_gen import zosc
+
+
+def test_write_wavetable(tmp_path):
+    """ test writing a wavetable to an h2p file """
+    filename = str(tmp_path / 'osc.h2p')
+    wave = np.array([-1.0, 0.0, 0.5, 1.0])
+    zosc.write_wavetable(wavetable.WaveTable(2, waves=[wave]), filename)
+    exp = ("#defaults=no\n#cm=OSC\nWave=2\n<?\n\nfloat Wave[4];\n\n"
+           "//table 1\n"
+           "Wave[0] = -0.9999690000;\n"
+           "Wave[1] = 0.0000000000;\n"
+           "Wave[2] = 0.4999845000;\n"
+           "Wave[3] = 0.9999690000;\n"
+           "Selected.WaveTable.set(1, Wave);\n\n"
+           "//table 2\n"
+           "Wave[0] = 0.0000000000;\n"
+           "Wave[1] = 0.0000000000;\n"
+           "Wave[2] = 0.0000000000;\n"
+           "Wave[3] = 0.0000000000;\n"
+           "Selected.WaveTable.set(2, Wave);\n\n"
+           "?>")
+    with open(filename) as osc_file:
+        assert osc_file.read() == exp
+
+
+def test_write_wavetable_parallel(tmp_path):
+    """ test parallel formatting matches serial formatting """
+    sg = sig.SigGen(num_points=64)
+    wt = wavetable.WaveTable(4, waves=[sg.saw(), sg.sin(), sg.tri()])
+    serial = str(tmp_path / 'serial.h2p')
+    parallel = str(tmp_path / 'parallel.h2p')
+    zosc.write_wavetable(wt, serial)
+    zosc.write_wavetable(wt, parallel, processes=2)
+    with open(serial) as file_a, open(parallel) as file_b:
+        assert file_a.read() == file_b.read()
+
+
+def test_write_wavetable_single(tmp_path):
+    """ test single precision waves are scaled in single precision, as they
+    always have been """
+    filename = str(tmp_path / 'osc.h2p')
+    wave = np.array([-1.0, 0.1, 0.5, 1.0], dtype=np.float32)
+    zosc.write_wavetable(wavetable.WaveTable(1, waves=[wave]), filename)
+    exp = ("#defaults=no\n#cm=OSC\nWave=2\n<?\n\nfloat Wave[4];\n\n"
+           "//table 1\n"
+           "Wave[0] = -0.9999690056;\n"
+           "Wave[1] = 0.0999969020;\n"
+           "Wave[2] = 0.4999845028;\n"
+           "Wave[3] = 0.9999690056;\n"
+           "Selected.WaveTable.set(1, Wave);\n\n"
+           "?>")
+    with open(filename) as osc_file:
+        assert osc_file.read() == exp